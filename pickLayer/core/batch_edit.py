@@ -0,0 +1,151 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+from typing import Any, Callable, Iterable, Optional
+
+from qgis.core import QgsVectorLayer
+from qgis.PyQt.QtCore import QObject, Qt, QTimer, pyqtSignal
+from qgis.PyQt.QtWidgets import QProgressDialog
+from qgis.utils import iface
+
+from pickLayer.qgis_plugin_tools.tools.i18n import tr
+from pickLayer.qgis_plugin_tools.tools.messages import MsgBar
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+CHUNK_SIZE = 100
+
+_NO_MORE_ITEMS = object()
+
+
+class ChunkedEditJob(QObject):
+    """
+    Edits features of a layer in chunks as one edit command.
+
+    Chunks are processed from the event loop, so QGIS stays responsive. The
+    edit command stays open across the chunks, so a window modal progress
+    dialog keeps the user from editing, undoing or saving in between.
+    Canceling the job undoes all the edits made by it.
+    """
+
+    finished = pyqtSignal(bool)  # True if all the items were processed
+
+    def __init__(
+        self,
+        layer: QgsVectorLayer,
+        description: str,
+        items: Iterable[Any],
+        item_count: int,
+        process_item: Callable[[Any], None],
+        finalize: Optional[Callable[[], None]] = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        super().__init__()
+        self.layer = layer
+        self.description = description
+        self.item_count = item_count
+        self.processed_count = 0
+        self._items = iter(items)
+        self._process_item = process_item
+        self._finalize = finalize
+        self._chunk_size = chunk_size
+        self._running = False
+        self._progress_dialog: Optional[QProgressDialog] = None
+
+    def start(self) -> None:
+        if not self.layer.isEditable():
+            MsgBar.warning(tr("Layer {} is not editable", self.layer.name()))
+            self.finished.emit(False)
+            return
+        self.layer.beginEditCommand(self.description)
+        self._running = True
+        self._show_progress()
+        QTimer.singleShot(0, self._process_chunk)
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def cancel(self) -> None:
+        if not self._running:
+            return
+        LOGGER.info(tr("{} canceled", self.description))
+        self._stop(completed=False)
+
+    def _process_chunk(self) -> None:
+        if not self._running:
+            return
+        if not self.layer.isEditable():
+            self._stop(completed=False)
+            return
+
+        try:
+            for _ in range(self._chunk_size):
+                item = next(self._items, _NO_MORE_ITEMS)
+                if item is _NO_MORE_ITEMS:
+                    if self._finalize is not None:
+                        self._finalize()
+                    self._stop(completed=True)
+                    return
+                self._process_item(item)
+                if not self._running:
+                    # Canceled while processing the item
+                    return
+                self.processed_count += 1
+        except Exception as e:
+            self._stop(completed=False)
+            MsgBar.exception(
+                tr("Error occurred: {}", str(e)), tr("Check log for more details.")
+            )
+            return
+
+        if self._progress_dialog is not None:
+            self._progress_dialog.setValue(self.processed_count)
+        QTimer.singleShot(0, self._process_chunk)
+
+    def _stop(self, completed: bool) -> None:
+        self._running = False
+        if completed:
+            self.layer.endEditCommand()
+            self.layer.triggerRepaint()
+        elif self.layer.isEditable():
+            self.layer.destroyEditCommand()
+        self._hide_progress()
+        self.finished.emit(completed)
+
+    def _show_progress(self) -> None:
+        self._progress_dialog = QProgressDialog(
+            self.description,
+            tr("Cancel"),
+            0,
+            max(self.item_count, 1),
+            iface.mainWindow(),
+        )
+        self._progress_dialog.setWindowModality(Qt.WindowModal)
+        self._progress_dialog.setMinimumDuration(0)
+        self._progress_dialog.setAutoReset(False)
+        self._progress_dialog.canceled.connect(self.cancel)
+        self._progress_dialog.show()
+
+    def _hide_progress(self) -> None:
+        if self._progress_dialog is not None:
+            self._progress_dialog.canceled.disconnect(self.cancel)
+            self._progress_dialog.close()
+            self._progress_dialog.deleteLater()
+        self._progress_dialog = None
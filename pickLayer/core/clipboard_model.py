@@ -0,0 +1,135 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+from functools import partial
+from typing import List, NamedTuple, Optional
+
+from qgis.core import QgsApplication, QgsGeometry, QgsTask
+from qgis.PyQt.QtGui import QClipboard
+
+from pickLayer.qgis_plugin_tools.tools.i18n import tr
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+# Clipboard contents longer than this are parsed in a background task
+LARGE_CLIPBOARD_SIZE = 100000  # characters
+
+
+class ClipboardFeature(NamedTuple):
+    """First feature of copied features in the clipboard"""
+
+    field_names: List[str]
+    attribute_values: List[str]
+    geometry: QgsGeometry
+
+
+def _get_line(text: str, start: int) -> str:
+    end = text.find("\n", start)
+    return text[start : end if end != -1 else len(text)].rstrip("\r")
+
+
+def parse_clipboard_text(text: str) -> Optional[ClipboardFeature]:
+    """
+    Parses the first feature from features copied as text.
+
+    Only the header and the first data row are read, so the cost does not
+    depend on the number of copied features.
+    """
+    header_end = text.find("\n")
+    if header_end == -1:
+        return None
+    header = text[:header_end].rstrip("\r")
+    row = _get_line(text, header_end + 1)
+    if not row:
+        return None
+
+    feature_values = row.split("\t")
+    return ClipboardFeature(
+        header.split("\t")[1:],
+        feature_values[1:],
+        QgsGeometry.fromWkt(feature_values[0]),
+    )
+
+
+def _parse_in_task(task: QgsTask, text: str) -> Optional[ClipboardFeature]:
+    return parse_clipboard_text(text)
+
+
+class ClipboardModel:
+    """
+    Parsed contents of the clipboard.
+
+    Clipboard is parsed once every time its contents change, large contents
+    are parsed in a background task. Until the parsing is done the model is
+    empty.
+    """
+
+    def __init__(self, clipboard: QClipboard) -> None:
+        self.clipboard = clipboard
+        self.feature: Optional[ClipboardFeature] = None
+        self._generation = 0
+        self._task: Optional[QgsTask] = None
+        self.clipboard.dataChanged.connect(self.update)
+        self.update()
+
+    def update(self) -> None:
+        self._generation += 1
+        self.feature = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        text = self.clipboard.text()
+        if len(text) < LARGE_CLIPBOARD_SIZE:
+            self.feature = parse_clipboard_text(text)
+            return
+
+        LOGGER.debug(f"Parsing {len(text)} characters from clipboard in background")
+        self._task = QgsTask.fromFunction(
+            tr("Reading clipboard"),
+            _parse_in_task,
+            text,
+            on_finished=partial(self._on_parsed, self._generation),
+            flags=QgsTask.CanCancel,
+        )
+        QgsApplication.taskManager().addTask(self._task)
+
+    def is_parsing(self) -> bool:
+        return self._task is not None
+
+    def disconnect(self) -> None:
+        self.clipboard.dataChanged.disconnect(self.update)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _on_parsed(
+        self,
+        generation: int,
+        exception: Optional[Exception],
+        result: Optional[ClipboardFeature] = None,
+    ) -> None:
+        if generation != self._generation:
+            return
+        self._task = None
+        if exception is not None:
+            LOGGER.warning(tr("Could not read clipboard: {}", str(exception)))
+            return
+        self.feature = result
@@ -0,0 +1,112 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+from functools import partial
+from typing import Callable, List, Optional
+
+from qgis.core import QgsGeometry, QgsMapLayer
+from qgis.gui import QgsMapCanvas, QgsRubberBand
+from qgis.PyQt.QtCore import QTimer
+from qgis.PyQt.QtGui import QColor
+
+HIGHLIGHT_COLOR = "#36AF6C"
+FLASH_INTERVAL = 100  # ms
+# Flash is shown, hidden, shown again and removed
+FLASH_DURATION = 3 * FLASH_INTERVAL  # ms
+RUBBER_BAND_POOL_SIZE = 3
+
+
+class _Flash:
+    """Single rubber band of the pool and its animation state"""
+
+    def __init__(self, canvas: QgsMapCanvas, geometry_type: int) -> None:
+        self.rubber_band = QgsRubberBand(canvas, geometry_type)
+        self.rubber_band.setColor(QColor(HIGHLIGHT_COLOR))
+        self.rubber_band.setFillColor(QColor(HIGHLIGHT_COLOR))
+        self.rubber_band.setWidth(2)
+        self.timer = QTimer()
+        self.timer.setInterval(FLASH_INTERVAL)
+        self.timer.timeout.connect(self._next_step)
+        self.steps: List[Callable[[], None]] = []
+
+    def start(self, geometry: QgsGeometry, layer: Optional[QgsMapLayer]) -> None:
+        self.timer.stop()
+        self.rubber_band.reset(geometry.type())
+        self.rubber_band.setToGeometry(geometry, layer)
+        self.rubber_band.show()
+        self.steps = [
+            self.rubber_band.hide,
+            self.rubber_band.show,
+            partial(self.rubber_band.reset, geometry.type()),
+        ]
+        self.timer.start()
+
+    def is_active(self) -> bool:
+        return self.timer.isActive()
+
+    def stop(self) -> None:
+        self.timer.stop()
+        self.steps = []
+        self.rubber_band.reset()
+
+    def _next_step(self) -> None:
+        if self.steps:
+            self.steps.pop(0)()
+        if not self.steps:
+            self.timer.stop()
+
+
+class FeatureHighlighter:
+    """
+    Flashes geometries on the map canvas without blocking the event loop.
+
+    Rubber bands are reused from a small pool, the oldest flash is cut short
+    if all of them are in use.
+    """
+
+    def __init__(self, canvas: QgsMapCanvas) -> None:
+        self.canvas = canvas
+        self._pool: List[_Flash] = []
+        self._next_index = 0
+
+    def flash(self, geometry: QgsGeometry, layer: Optional[QgsMapLayer]) -> None:
+        """Starts the flash animation and returns immediately"""
+        self._acquire(geometry.type()).start(geometry, layer)
+
+    def is_flashing(self) -> bool:
+        return any(flash.is_active() for flash in self._pool)
+
+    def clear(self) -> None:
+        """Stops all flashes and removes the rubber bands from the canvas"""
+        for flash in self._pool:
+            flash.stop()
+            self.canvas.scene().removeItem(flash.rubber_band)
+        self._pool = []
+        self._next_index = 0
+
+    def _acquire(self, geometry_type: int) -> _Flash:
+        for flash in self._pool:
+            if not flash.is_active():
+                return flash
+        if len(self._pool) < RUBBER_BAND_POOL_SIZE:
+            flash = _Flash(self.canvas, geometry_type)
+            self._pool.append(flash)
+            return flash
+        flash = self._pool[self._next_index]
+        self._next_index = (self._next_index + 1) % len(self._pool)
+        return flash
@@ -0,0 +1,425 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from qgis.core import (
+    Qgis,
+    QgsCoordinateReferenceSystem,
+    QgsExpressionContextUtils,
+    QgsFeature,
+    QgsFeatureRenderer,
+    QgsFeatureRequest,
+    QgsFeedback,
+    QgsMapLayer,
+    QgsMapSettings,
+    QgsPointXY,
+    QgsRectangle,
+    QgsRenderContext,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
+from qgis.gui import QgsMapCanvas
+from qgis.PyQt.QtCore import QElapsedTimer, QObject, QThread, QTimer, pyqtSignal
+
+from pickLayer.core.timing_metrics import TIMING_METRICS, Stage, elapsed_ms
+from pickLayer.core.transform_cache import TRANSFORM_CACHE
+from pickLayer.qgis_plugin_tools.tools.i18n import tr
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+# Features fetched per layer, the search radius is only a few pixels wide
+IDENTIFY_FEATURE_LIMIT = 100
+POLL_INTERVAL = 10  # ms
+
+_query_pool: Optional[ThreadPoolExecutor] = None
+# Queries that missed the latency budget but are still blocking a worker
+_overdue_queries: Dict[str, Future] = {}
+
+
+class IdentifyHit(NamedTuple):
+    """Lightweight replacement for QgsMapToolIdentify.IdentifyResult"""
+
+    mLayer: QgsVectorLayer  # noqa N815
+    mFeature: QgsFeature  # noqa N815
+
+
+def get_search_rect(location: QgsPointXY, search_radius: float) -> QgsRectangle:
+    return QgsRectangle(
+        location.x() - search_radius,
+        location.y() - search_radius,
+        location.x() + search_radius,
+        location.y() + search_radius,
+    )
+
+
+def search_radius_to_map_units(
+    search_radius_mm: float, map_settings: QgsMapSettings
+) -> float:
+    # Overriding searchRadiusMM does not affect searchRadiusMU, so the radius
+    # is converted in memory. Logic copied here from QgsMapTool.searchRadiusMU
+    context = QgsRenderContext.fromMapSettings(map_settings)
+    return (
+        search_radius_mm
+        * context.scaleFactor()
+        * context.mapToPixel().mapUnitsPerPixel()
+    )
+
+
+def get_hits_in_rect(
+    hits: List[IdentifyHit],
+    search_rect: QgsRectangle,
+    map_crs: QgsCoordinateReferenceSystem,
+) -> List[IdentifyHit]:
+    """Returns the hits whose geometry intersects the map crs rectangle"""
+    layer_rects: Dict[str, QgsRectangle] = {}
+    hits_in_rect = []
+    for hit in hits:
+        layer_id = hit.mLayer.id()
+        if layer_id not in layer_rects:
+            layer_rects[layer_id] = TRANSFORM_CACHE.transform_bounding_box(
+                search_rect, map_crs, hit.mLayer.crs()
+            )
+        if hit.mFeature.geometry().intersects(layer_rects[layer_id]):
+            hits_in_rect.append(hit)
+    return hits_in_rect
+
+
+def get_identifiable_vector_layers(canvas: QgsMapCanvas) -> List[QgsVectorLayer]:
+    """Returns the canvas vector layers identify would query, top-most first"""
+    scale = canvas.mapSettings().scale()
+    return [
+        layer
+        for layer in canvas.layers()
+        if isinstance(layer, QgsVectorLayer)
+        and layer.isSpatial()
+        and layer.flags() & QgsMapLayer.Identifiable
+        and layer.isInScaleRange(scale)
+    ]
+
+
+def renderer_filters_features(layer: QgsVectorLayer) -> bool:
+    """Whether the renderer of the layer may leave some of its features out"""
+    renderer = layer.renderer()
+    return renderer is not None and bool(
+        renderer.capabilities() & QgsFeatureRenderer.Filter
+    )
+
+
+class LayerQuery:
+    """
+    Geometry query of a single layer that can be run outside the main thread.
+
+    The feature source and renderer are snapshotted on creation, so the query
+    must be created on the main thread. Unlike identify, attributes are not
+    fetched unless the renderer needs them to decide whether the feature is
+    visible.
+    """
+
+    def __init__(
+        self,
+        layer: QgsVectorLayer,
+        layer_rect: QgsRectangle,
+        map_settings: QgsMapSettings,
+        limit: Optional[int] = IDENTIFY_FEATURE_LIMIT,
+    ) -> None:
+        self.layer = layer
+        self.limit = limit
+        self.feedback = QgsFeedback()
+        self._provider = layer.providerType()
+        self._source = QgsVectorLayerFeatureSource(layer)
+        self._request = QgsFeatureRequest().setFilterRect(layer_rect)
+        self._request.setFlags(QgsFeatureRequest.ExactIntersect)
+        if Qgis.QGIS_VERSION_INT >= 32000:
+            # Lets the provider interrupt a request that blocks before
+            # returning the first feature
+            self._request.setFeedback(self.feedback)
+        self._renderer: Optional[QgsFeatureRenderer] = None
+        self._context: Optional[QgsRenderContext] = None
+
+        if not renderer_filters_features(layer):
+            self._request.setNoAttributes()
+            if limit is not None:
+                self._request.setLimit(limit)
+            return
+
+        self._renderer = layer.renderer().clone()
+        self._fields = layer.fields()
+        self._context = QgsRenderContext.fromMapSettings(map_settings)
+        self._context.expressionContext().appendScope(
+            QgsExpressionContextUtils.layerScope(layer)
+        )
+
+    def run(self) -> List[QgsFeature]:
+        started_at = time.perf_counter()
+        features = self._run()
+        if not self.feedback.isCanceled():
+            TIMING_METRICS.record(
+                Stage.LAYER_QUERY, elapsed_ms(started_at), self._provider
+            )
+        return features
+
+    def _run(self) -> List[QgsFeature]:
+        if self._renderer is None:
+            return self._fetch(lambda feature: True)
+
+        self._renderer.startRender(self._context, self._fields)
+        try:
+            self._request.setSubsetOfAttributes(
+                self._renderer.usedAttributes(self._context), self._fields
+            )
+            return self._fetch(self._is_rendered)
+        finally:
+            self._renderer.stopRender(self._context)
+
+    def _is_rendered(self, feature: QgsFeature) -> bool:
+        self._context.expressionContext().setFeature(feature)
+        return self._renderer.willRenderFeature(feature, self._context)
+
+    def _fetch(self, accept: Callable[[QgsFeature], bool]) -> List[QgsFeature]:
+        features = []
+        for feature in self._source.getFeatures(self._request):
+            if self.feedback.isCanceled():
+                return []
+            if accept(feature):
+                features.append(feature)
+                if self.limit is not None and len(features) >= self.limit:
+                    break
+        return features
+
+
+def query_layer_geometries(
+    layer: QgsVectorLayer,
+    layer_rect: QgsRectangle,
+    map_settings: QgsMapSettings,
+    limit: int = IDENTIFY_FEATURE_LIMIT,
+) -> List[QgsFeature]:
+    """Fetches the visible features intersecting the rectangle in layer crs"""
+    return LayerQuery(layer, layer_rect, map_settings, limit).run()
+
+
+class LayerSearch(QObject):
+    """
+    Features of several layers searched concurrently within a latency budget.
+
+    Layer queries that do not answer within the budget are canceled and their
+    layers skipped. Layers whose earlier query is still blocking a worker
+    after missing the budget are skipped without querying, so slow layers
+    can not fill the query pool. The search can be waited for or left running
+    in the event loop, in which case finished is emitted once done.
+    """
+
+    finished = pyqtSignal()
+
+    def __init__(self, latency_budget: int) -> None:
+        super().__init__()
+        self.latency_budget = latency_budget  # ms
+        self.canceled = False
+        self.skipped_layers: List[QgsVectorLayer] = []
+        self._layers: List[QgsVectorLayer] = []
+        self._features: Dict[str, List[QgsFeature]] = {}
+        self._queries: List[LayerQuery] = []
+        self._futures: List[Future] = []
+        self._running = False
+        self._elapsed_timer = QElapsedTimer()
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL)
+        self._poll_timer.timeout.connect(self._poll)
+
+    def add_features(self, layer: QgsVectorLayer, features: List[QgsFeature]) -> None:
+        """Adds features of a layer that are known without querying"""
+        self._layers.append(layer)
+        self._features[layer.id()] = features
+
+    def add_query(self, query: LayerQuery) -> None:
+        self._layers.append(query.layer)
+        self._queries.append(query)
+
+    def start(self) -> None:
+        self._running = True
+        self._elapsed_timer.start()
+        queries = []
+        for query in self._queries:
+            overdue_query = _overdue_queries.get(query.layer.id())
+            if overdue_query is not None and not overdue_query.done():
+                self.skipped_layers.append(query.layer)
+            else:
+                queries.append(query)
+        self._queries = queries
+        pool = _get_query_pool()
+        self._futures = [pool.submit(query.run) for query in self._queries]
+        self._poll_timer.start()
+
+    def wait(self) -> None:
+        """Blocks until every layer has answered or the budget is spent"""
+        if not self._running:
+            return
+        remaining = max(self.latency_budget - self._elapsed_timer.elapsed(), 0)
+        wait(self._futures, timeout=remaining / 1000)
+        self._finish()
+
+    def cancel(self) -> None:
+        if not self._running:
+            return
+        self.canceled = True
+        self._finish()
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def hits(self) -> List[IdentifyHit]:
+        """Returns the found features in the order the layers were added"""
+        return [
+            IdentifyHit(layer, feature)
+            for layer in self._layers
+            for feature in self._features.get(layer.id(), [])
+        ]
+
+    def _poll(self) -> None:
+        if (
+            all(future.done() for future in self._futures)
+            or self._elapsed_timer.elapsed() >= self.latency_budget
+        ):
+            self._finish()
+
+    def _finish(self) -> None:
+        self._running = False
+        self._poll_timer.stop()
+        for query, future in zip(self._queries, self._futures):
+            if not future.done():
+                query.feedback.cancel()
+                if not future.cancel() and not self.canceled:
+                    _overdue_queries[query.layer.id()] = future
+                self.skipped_layers.append(query.layer)
+                continue
+            try:
+                self._features[query.layer.id()] = future.result()
+            except Exception as e:
+                LOGGER.warning(
+                    tr("Could not query layer {}: {}", query.layer.name(), str(e))
+                )
+                self.skipped_layers.append(query.layer)
+
+        if self.skipped_layers and not self.canceled:
+            LOGGER.info(
+                tr(
+                    "Skipped layers that did not answer in {} ms: {}",
+                    self.latency_budget,
+                    ", ".join(layer.name() for layer in self.skipped_layers),
+                )
+            )
+        self.finished.emit()
+
+
+class TieredLayerSearch(QObject):
+    """
+    Layer searches resolved in order until one of them finds features.
+
+    Meant for searches where any feature of an earlier tier wins over the
+    features of the later tiers. The tiers are run concurrently, each with the
+    full latency budget, so a slow layer of an earlier tier does not starve
+    the later ones. Once the earlier tiers have answered without features and
+    a tier has found some, the later tiers are canceled.
+    """
+
+    finished = pyqtSignal()
+
+    def __init__(self, tiers: List[LayerSearch], latency_budget: int) -> None:
+        super().__init__()
+        self.latency_budget = latency_budget  # ms
+        self.canceled = False
+        self.skipped_layers: List[QgsVectorLayer] = []
+        self.searched_tier_count = 0
+        self._tiers = tiers
+        self._hits: List[IdentifyHit] = []
+        self._running = False
+        for tier in tiers:
+            tier.finished.connect(self._on_tier_finished)
+
+    def start(self) -> None:
+        self._running = True
+        for tier in self._tiers:
+            tier.latency_budget = self.latency_budget
+            tier.start()
+        self._resolve()
+
+    def wait(self) -> None:
+        """Blocks until a tier has found features or the budget is spent"""
+        for tier in self._tiers:
+            if not self._running:
+                return
+            tier.wait()
+
+    def cancel(self) -> None:
+        if not self._running:
+            return
+        self.canceled = True
+        self._finish()
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def hits(self) -> List[IdentifyHit]:
+        """Returns the features found by the first tier that found any"""
+        return self._hits
+
+    def _on_tier_finished(self) -> None:
+        if self._running:
+            self._resolve()
+
+    def _resolve(self) -> None:
+        for tier in self._tiers[self.searched_tier_count :]:
+            if tier.is_running():
+                return
+            self.searched_tier_count += 1
+            self.skipped_layers.extend(tier.skipped_layers)
+            self._hits = tier.hits()
+            if self._hits:
+                break
+        self._finish()
+
+    def _finish(self) -> None:
+        self._running = False
+        for tier in self._tiers:
+            tier.cancel()
+        LOGGER.debug(
+            f"Searched {self.searched_tier_count} of {len(self._tiers)} layer tiers"
+        )
+        self.finished.emit()
+
+
+def _get_query_pool() -> ThreadPoolExecutor:
+    global _query_pool
+    if _query_pool is None:
+        _query_pool = ThreadPoolExecutor(
+            max_workers=max(QThread.idealThreadCount(), 2),
+            thread_name_prefix="PickLayerQuery",
+        )
+    return _query_pool
+
+
+def shutdown_query_pool() -> None:
+    global _query_pool
+    if _query_pool is not None:
+        _query_pool.shutdown(wait=False)
+        _query_pool = None
+    _overdue_queries.clear()
@@ -0,0 +1,106 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+from typing import Optional, Set
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
+
+from pickLayer.core.layer_index import BackgroundLayerIndex, LayerIndexEntry
+from pickLayer.qgis_plugin_tools.tools.i18n import tr
+
+
+def _is_invalid(geometry: QgsGeometry) -> bool:
+    return not geometry.isNull() and not geometry.isGeosValid()
+
+
+def _scan_invalid_ids(
+    task: QgsTask, source: QgsVectorLayerFeatureSource, feature_count: int
+) -> Optional[Set[int]]:
+    """Collects ids of invalid geometries in a background thread"""
+    invalid_ids = set()
+    request = QgsFeatureRequest().setNoAttributes()
+    for i, feature in enumerate(source.getFeatures(request)):
+        if task.isCanceled():
+            return None
+        if _is_invalid(feature.geometry()):
+            invalid_ids.add(feature.id())
+        if feature_count > 0 and i % 1000 == 0:
+            task.setProgress(100 * i / feature_count)
+    return invalid_ids
+
+
+class GeometryValidityIndex(BackgroundLayerIndex[Set[int]]):
+    """
+    Index of features with invalid geometries per vector layer.
+
+    Layers are scanned in the background the first time they are queried
+    and the index is kept up to date from the layer edit signals.
+    """
+
+    def invalid_ids(self, layer: QgsVectorLayer) -> Optional[Set[int]]:
+        """
+        Returns ids of the features with invalid geometry.
+
+        Returns None if the layer has not been scanned yet. In that case the
+        scan is started in the background.
+        """
+        entry = self._entries.get(layer.id())
+        if entry is None:
+            self._add_layer(layer)
+            return None
+        return entry.data
+
+    def is_valid(self, layer: QgsVectorLayer, feature: QgsFeature) -> bool:
+        invalid_ids = self.invalid_ids(layer)
+        if invalid_ids is None:
+            return not _is_invalid(feature.geometry())
+        return feature.id() not in invalid_ids
+
+    def _build_data(
+        self, task: QgsTask, source: QgsVectorLayerFeatureSource, feature_count: int
+    ) -> Optional[Set[int]]:
+        return _scan_invalid_ids(task, source, feature_count)
+
+    def _task_description(self, layer: QgsVectorLayer) -> str:
+        return tr("Checking geometries of {}", layer.name())
+
+    def _build_error_message(self, exception: Exception) -> str:
+        return tr("Could not check geometries of layer: {}", str(exception))
+
+    def _add_feature(
+        self, entry: LayerIndexEntry[Set[int]], fid: int, geometry: QgsGeometry
+    ) -> None:
+        if _is_invalid(geometry):
+            entry.data.add(fid)
+        else:
+            entry.data.discard(fid)
+
+    def _delete_feature(self, entry: LayerIndexEntry[Set[int]], fid: int) -> None:
+        entry.data.discard(fid)
+
+    def _change_geometry(
+        self, entry: LayerIndexEntry[Set[int]], fid: int, geometry: QgsGeometry
+    ) -> None:
+        self._add_feature(entry, fid, geometry)
@@ -0,0 +1,149 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+from collections import Counter, deque
+from functools import partial
+from typing import Deque, List, NamedTuple, Optional
+
+from qgis.core import QgsPointXY, QgsRectangle
+from qgis.gui import QgsMapCanvas
+from qgis.PyQt.QtCore import QTimer
+
+from pickLayer.core.feature_query import (
+    IDENTIFY_FEATURE_LIMIT,
+    IdentifyHit,
+    LayerQuery,
+    LayerSearch,
+    get_hits_in_rect,
+    get_identifiable_vector_layers,
+    get_search_rect,
+    search_radius_to_map_units,
+)
+from pickLayer.core.transform_cache import TRANSFORM_CACHE
+from pickLayer.definitions.settings import Settings
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+PREFETCH_DELAY = 150  # ms the cursor has to rest before prefetching
+PREFETCH_RADIUS_FACTOR = 4  # prefetched area compared to the search radius
+PREFETCH_CACHE_SIZE = 4
+
+
+class _PrefetchedArea(NamedTuple):
+    rect: QgsRectangle  # map crs
+    hits: List[IdentifyHit]
+
+
+class HoverPrefetcher:
+    """
+    Prefetches geometries around the resting cursor for the next click.
+
+    Prefetching starts when the cursor has rested for a while and only one
+    prefetch runs at a time. Moving the cursor or pressing a button, for
+    example to pan, cancels the running prefetch. Prefetched areas are
+    forgotten whenever the canvas is refreshed or its extent changes.
+    """
+
+    def __init__(self, canvas: QgsMapCanvas) -> None:
+        self._canvas = canvas
+        self._areas: Deque[_PrefetchedArea] = deque(maxlen=PREFETCH_CACHE_SIZE)
+        self._search: Optional[LayerSearch] = None
+        self._location: Optional[QgsPointXY] = None
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(PREFETCH_DELAY)
+        self._timer.timeout.connect(self._prefetch)
+        canvas.mapCanvasRefreshed.connect(self.clear)
+        canvas.extentsChanged.connect(self.clear)
+
+    def cursor_moved(self, location: QgsPointXY, panning: bool = False) -> None:
+        self._cancel_search()
+        if panning:
+            self._timer.stop()
+            return
+        self._location = location
+        self._timer.start()
+
+    def hits_in(self, search_rect: QgsRectangle) -> Optional[List[IdentifyHit]]:
+        """
+        Returns the prefetched features intersecting the map crs rectangle.
+
+        Returns None if the rectangle is not within a prefetched area.
+        """
+        map_crs = self._canvas.mapSettings().destinationCrs()
+        for area in self._areas:
+            if area.rect.contains(search_rect):
+                return get_hits_in_rect(area.hits, search_rect, map_crs)
+        return None
+
+    def clear(self) -> None:
+        self._timer.stop()
+        self._cancel_search()
+        self._areas.clear()
+
+    def disconnect(self) -> None:
+        self.clear()
+        for signal in [self._canvas.mapCanvasRefreshed, self._canvas.extentsChanged]:
+            try:
+                signal.disconnect(self.clear)
+            except (TypeError, RuntimeError):
+                # Already disconnected or the canvas is deleted
+                pass
+
+    def _prefetch(self) -> None:
+        if self._location is None:
+            return
+
+        map_settings = self._canvas.mapSettings()
+        search_radius = search_radius_to_map_units(
+            float(Settings.search_radius.get()), map_settings
+        )
+        if self.hits_in(get_search_rect(self._location, search_radius)) is not None:
+            return
+
+        rect = get_search_rect(self._location, search_radius * PREFETCH_RADIUS_FACTOR)
+        search = LayerSearch(Settings.query_latency_budget.get(typehint=int))
+        for layer in get_identifiable_vector_layers(self._canvas):
+            layer_rect = TRANSFORM_CACHE.transform_bounding_box(
+                rect, map_settings.destinationCrs(), layer.crs()
+            )
+            search.add_query(LayerQuery(layer, layer_rect, map_settings))
+        search.finished.connect(partial(self._on_prefetched, search, rect))
+        self._search = search
+        search.start()
+
+    def _on_prefetched(self, search: LayerSearch, rect: QgsRectangle) -> None:
+        if search is self._search:
+            self._search = None
+        if search.canceled or search.skipped_layers:
+            return
+
+        hits = search.hits()
+        hit_counts = Counter(hit.mLayer.id() for hit in hits)
+        if any(count >= IDENTIFY_FEATURE_LIMIT for count in hit_counts.values()):
+            # Some features of the area may be missing
+            return
+        LOGGER.debug(f"Prefetched {len(hits)} features around the cursor")
+        self._areas.append(_PrefetchedArea(rect, hits))
+
+    def _cancel_search(self) -> None:
+        if self._search is not None:
+            self._search.cancel()
+            self._search = None
@@ -0,0 +1,198 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+from collections import Counter
+from functools import partial
+from typing import Callable, List, Optional
+
+from qgis.core import QgsPointXY, QgsVectorLayer, QgsWkbTypes
+from qgis.gui import QgsMapCanvas, QgsRubberBand
+from qgis.PyQt.QtCore import QEvent, QObject, QPoint, QTimer
+from qgis.PyQt.QtGui import QColor
+from qgis.PyQt.QtWidgets import QToolTip
+
+from pickLayer.core.feature_highlighter import HIGHLIGHT_COLOR
+from pickLayer.core.feature_query import (
+    IDENTIFY_FEATURE_LIMIT,
+    IdentifyHit,
+    LayerSearch,
+    get_hits_in_rect,
+    get_search_rect,
+)
+from pickLayer.core.layer_candidates import score_identify_results
+
+PREVIEW_INTERVAL = 33  # ms, about 30 updates per second
+FETCH_RADIUS_FACTOR = 2
+
+
+class HoverPreview(QObject):
+    """
+    Shows the layer and feature that a click would activate under the cursor.
+
+    Features are fetched around the cursor with twice the search radius and
+    reused while the cursor stays within the search radius from where they
+    were fetched, so most updates only rank the features in memory. If a layer
+    hits the feature limit, the features closest to the cursor may be missing,
+    so they are fetched again with the search radius of a click and reused
+    only at the same location. Updates are capped to about 30 per second. The
+    preview is hidden when the cursor leaves the canvas.
+    """
+
+    def __init__(
+        self,
+        canvas: QgsMapCanvas,
+        create_search: Callable[[QgsPointXY, float], LayerSearch],
+        get_search_radius: Callable[[], float],
+    ) -> None:
+        super().__init__()
+        self._canvas = canvas
+        self.previewed_layer: Optional[QgsVectorLayer] = None
+        self._create_search = create_search
+        self._get_search_radius = get_search_radius
+        self._location: Optional[QgsPointXY] = None
+        self._anchor: Optional[QgsPointXY] = None
+        self._reuse_distance = 0.0  # map units from the anchor
+        self._hits: Optional[List[IdentifyHit]] = None
+        self._search: Optional[LayerSearch] = None
+        self._rubber_band = QgsRubberBand(canvas, QgsWkbTypes.PointGeometry)
+        self._rubber_band.setColor(QColor(HIGHLIGHT_COLOR))
+        self._rubber_band.setWidth(2)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(PREVIEW_INTERVAL)
+        self._timer.timeout.connect(self._update)
+        canvas.mapCanvasRefreshed.connect(self._forget_hits)
+        canvas.extentsChanged.connect(self._forget_hits)
+        canvas.installEventFilter(self)
+
+    def cursor_moved(self, location: QgsPointXY) -> None:
+        self._location = location
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def hide(self) -> None:
+        self._timer.stop()
+        self._location = None
+        self._forget_hits()
+        self._clear_preview()
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:  # noqa N802
+        if event.type() == QEvent.Leave:
+            self.hide()
+        return False
+
+    def unload(self) -> None:
+        """Hides the preview and disconnects from the canvas"""
+        self.hide()
+        self._canvas.removeEventFilter(self)
+        for signal in [self._canvas.mapCanvasRefreshed, self._canvas.extentsChanged]:
+            try:
+                signal.disconnect(self._forget_hits)
+            except (TypeError, RuntimeError):
+                # Already disconnected or the canvas is deleted
+                pass
+        self._canvas.scene().removeItem(self._rubber_band)
+
+    def _update(self) -> None:
+        if self._location is None:
+            return
+        search_radius = self._get_search_radius()
+        if (
+            self._anchor is not None
+            and self._anchor.distance(self._location) <= self._reuse_distance
+        ):
+            if self._hits is not None:
+                self._show_best(self._location, search_radius)
+            # Otherwise the running fetch shows the result once finished
+            return
+        self._fetch(self._location, search_radius)
+
+    def _fetch(
+        self,
+        location: QgsPointXY,
+        search_radius: float,
+        radius_factor: float = FETCH_RADIUS_FACTOR,
+    ) -> None:
+        self._forget_hits()
+        self._anchor = location
+        self._reuse_distance = (radius_factor - 1) * search_radius
+        self._search = self._create_search(location, radius_factor * search_radius)
+        self._search.finished.connect(
+            partial(self._on_fetched, self._search, search_radius, radius_factor)
+        )
+        self._search.start()
+
+    def _on_fetched(
+        self, search: LayerSearch, search_radius: float, radius_factor: float
+    ) -> None:
+        if search is not self._search:
+            return
+        self._search = None
+        if search.canceled:
+            return
+
+        hits = search.hits()
+        hit_counts = Counter(hit.mLayer.id() for hit in hits)
+        if radius_factor > 1 and any(
+            count >= IDENTIFY_FEATURE_LIMIT for count in hit_counts.values()
+        ):
+            # Some features of the area may be missing
+            self._fetch(self._anchor, search_radius, radius_factor=1)
+            return
+        self._hits = hits
+        self._update()
+
+    def _forget_hits(self) -> None:
+        if self._search is not None:
+            self._search.cancel()
+            self._search = None
+        self._hits = None
+        self._anchor = None
+        self._reuse_distance = 0.0
+
+    def _show_best(self, location: QgsPointXY, search_radius: float) -> None:
+        map_crs = self._canvas.mapSettings().destinationCrs()
+        hits = get_hits_in_rect(
+            self._hits, get_search_rect(location, search_radius), map_crs
+        )
+        candidates = score_identify_results(
+            hits, location, map_crs, best_only=True
+        ).candidates
+        if not candidates:
+            self._clear_preview()
+            return
+
+        best_hit = next(
+            hit
+            for hit in hits
+            if hit.mLayer.id() == candidates[0].layer_id
+            and hit.mFeature.id() == candidates[0].feature_id
+        )
+        self.previewed_layer = best_hit.mLayer
+        self._rubber_band.setToGeometry(best_hit.mFeature.geometry(), best_hit.mLayer)
+        pixel = self._canvas.getCoordinateTransform().transform(location)
+        QToolTip.showText(
+            self._canvas.mapToGlobal(QPoint(int(pixel.x()), int(pixel.y()))),
+            best_hit.mLayer.name(),
+            self._canvas,
+        )
+
+    def _clear_preview(self) -> None:
+        self.previewed_layer = None
+        self._rubber_band.reset()
+        QToolTip.hideText()
@@ -19,12 +19,28 @@
 #  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
 
 import logging
+import time
+from functools import partial
+from typing import List, Optional
 
 from qgis.core import QgsFeature, QgsVectorLayer
 from qgis.gui import QgsMapCanvas, QgsMapToolIdentify
-from qgis.PyQt.QtCore import pyqtSignal
-from qgis.PyQt.QtGui import QCursor
+from qgis.PyQt.QtCore import QPoint, Qt, pyqtSignal
+from qgis.PyQt.QtGui import QCursor, QKeyEvent
+from qgis.PyQt.QtWidgets import QMenu
 
+from pickLayer.core.feature_query import (
+    IdentifyHit,
+    LayerQuery,
+    LayerSearch,
+    get_identifiable_vector_layers,
+    get_search_rect,
+    search_radius_to_map_units,
+)
+from pickLayer.core.hover_prefetch import HoverPrefetcher
+from pickLayer.core.profiling import profiled
+from pickLayer.core.timing_metrics import TIMING_METRICS, Stage, elapsed_ms
+from pickLayer.core.transform_cache import TRANSFORM_CACHE
 from pickLayer.definitions.settings import Settings
 from pickLayer.qgis_plugin_tools.tools.i18n import tr
 from pickLayer.qgis_plugin_tools.tools.messages import MsgBar
@@ -37,32 +53,183 @@ class IdentifyGeometry(QgsMapToolIdentify):
     geom_identified = pyqtSignal(QgsVectorLayer, QgsFeature)
 
     def __init__(
-        self, canvas: QgsMapCanvas, layerType: str = "AllLayers"  # noqa N803
+        self,
+        canvas: QgsMapCanvas,
+        layerType: str = "AllLayers",  # noqa N803
+        prefetch_on_hover: bool = False,
     ) -> None:
         self.layer_type = getattr(QgsMapToolIdentify, layerType)
         self.canvas = canvas
         QgsMapToolIdentify.__init__(self, canvas)
         self.setCursor(QCursor())
+        self.pending_search: Optional[LayerSearch] = None
+        self.prefetcher = HoverPrefetcher(canvas) if prefetch_on_hover else None
+
+    def canvasMoveEvent(self, mouse_event) -> None:  # noqa N802
+        if self.prefetcher is not None:
+            self.prefetcher.cursor_moved(
+                self.toMapCoordinates(mouse_event.pos()),
+                panning=mouse_event.buttons() != Qt.NoButton,
+            )
+
+    def deactivate(self) -> None:
+        if self.prefetcher is not None:
+            self.prefetcher.clear()
+        super().deactivate()
+
+    def unload(self) -> None:
+        """Cancels the running search and disconnects from the canvas"""
+        if self.pending_search is not None:
+            self.pending_search.cancel()
+        if self.prefetcher is not None:
+            self.prefetcher.disconnect()
+            self.prefetcher = None
+        if self.canvas.mapTool() is self:
+            self.canvas.unsetMapTool(self)
 
     def canvasReleaseEvent(self, mouse_event) -> None:  # noqa N802
-        orig_search_radius = Settings.identify_tool_search_radius.get()
         try:
-            search_radius = Settings.search_radius.get()
-            LOGGER.debug(f"Setting search radius to {search_radius}")
-            Settings.identify_tool_search_radius.set(search_radius)
-            results = self.identify(
-                mouse_event.x(), mouse_event.y(), self.LayerSelection, self.layer_type
+            self._start_search(mouse_event.pos())
+        except Exception as e:
+            MsgBar.exception(
+                tr("Error occurred: {}", str(e)), tr("Check log for more details.")
+            )
+
+    def keyPressEvent(self, key_event: QKeyEvent) -> None:  # noqa N802
+        if key_event.key() == Qt.Key_Escape and self.pending_search is not None:
+            LOGGER.info(tr("Search canceled"))
+            self.pending_search.cancel()
+            key_event.accept()
+            return
+        key_event.ignore()
+
+    def _start_search(self, point: QPoint) -> None:
+        """
+        Searches the features under the point without blocking the event loop.
+
+        Only geometries are fetched while searching. Features prefetched
+        around the cursor are used right away. A click while the previous
+        search is still running replaces it.
+        """
+        started_at = time.perf_counter()
+        hits = self._search(point, started_at)
+        if hits is not None:
+            LOGGER.debug("Using prefetched features")
+            self._use_hits(hits, [], point, started_at)
+
+    @profiled
+    def _search(self, point: QPoint, started_at: float) -> Optional[List[IdentifyHit]]:
+        """Returns the prefetched hits under the point or starts a search"""
+        if self.pending_search is not None:
+            self.pending_search.cancel()
+        if not self.layer_type & QgsMapToolIdentify.VectorLayer:
+            return None
+
+        map_settings = self.canvas.mapSettings()
+        search_radius = Settings.search_radius.get()
+        LOGGER.debug(f"Using search radius {search_radius}")
+        search_rect = get_search_rect(
+            self.toMapCoordinates(point),
+            search_radius_to_map_units(float(search_radius), map_settings),
+        )
+        if self.prefetcher is not None:
+            hits = self.prefetcher.hits_in(search_rect)
+            if hits is not None:
+                return _get_first_hit_per_layer(hits)
+
+        search = LayerSearch(Settings.query_latency_budget.get(typehint=int))
+        for layer in get_identifiable_vector_layers(self.canvas):
+            layer_rect = TRANSFORM_CACHE.transform_bounding_box(
+                search_rect, map_settings.destinationCrs(), layer.crs()
             )
+            search.add_query(LayerQuery(layer, layer_rect, map_settings, limit=1))
+        search.finished.connect(
+            partial(self._on_search_finished, search, point, started_at)
+        )
+        self.pending_search = search
+        search.start()
+        return None
+
+    def _on_search_finished(
+        self, search: LayerSearch, point: QPoint, started_at: float
+    ) -> None:
+        if search is self.pending_search:
+            self.pending_search = None
+        if search.canceled:
+            return
+
+        self._use_hits(search.hits(), search.skipped_layers, point, started_at)
+
+    def _use_hits(
+        self,
+        hits: List[IdentifyHit],
+        skipped_layers: List[QgsVectorLayer],
+        point: QPoint,
+        started_at: float,
+    ) -> None:
+        TIMING_METRICS.record(Stage.IDENTIFY, elapsed_ms(started_at))
+        try:
+            hit = self._get_identified_feature(hits, point)
         except Exception as e:
             MsgBar.exception(
                 tr("Error occurred: {}", str(e)), tr("Check log for more details.")
             )
-            results = []
-        finally:
-            Settings.identify_tool_search_radius.set(orig_search_radius)
+            return
 
-        if len(results) > 0:
+        if hit is not None:
             LOGGER.debug(tr("Feature found"))
-            self.geom_identified.emit(
-                results[0].mLayer, QgsFeature(results[0].mFeature)
+            TIMING_METRICS.record(
+                Stage.CLICK, elapsed_ms(started_at), hit.mLayer.providerType()
+            )
+            self.geom_identified.emit(hit.mLayer, hit.mFeature)
+        elif skipped_layers:
+            MsgBar.warning(
+                tr("Layers did not answer in time"),
+                tr(
+                    "Skipped layers: {}",
+                    ", ".join(layer.name() for layer in skipped_layers),
+                ),
             )
+
+    def _get_identified_feature(
+        self, hits: List[IdentifyHit], point: QPoint
+    ) -> Optional[IdentifyHit]:
+        """
+        Returns the chosen hit with its geometry and attributes.
+
+        Hits from the layers that answered in time are used. If features are
+        found from several layers, the layer is chosen from a menu like
+        identify does.
+        """
+        if not hits:
+            return None
+        hit = hits[0] if len(hits) == 1 else self._choose_hit(hits, point)
+        if hit is None:
+            return None
+        return self._fetch_feature(hit)
+
+    @profiled
+    def _fetch_feature(self, hit: IdentifyHit) -> Optional[IdentifyHit]:
+        """Fetches the geometry and attributes of the hit feature"""
+        feature = hit.mLayer.getFeature(hit.mFeature.id())
+        if not feature.isValid():
+            return None
+        return IdentifyHit(hit.mLayer, feature)
+
+    def _choose_hit(
+        self, hits: List[IdentifyHit], point: QPoint
+    ) -> Optional[IdentifyHit]:
+        menu = QMenu(self.canvas)
+        for hit in hits:
+            menu.addAction(hit.mLayer.name())
+        chosen_action = menu.exec_(self.canvas.mapToGlobal(point))
+        if chosen_action is None:
+            return None
+        return hits[menu.actions().index(chosen_action)]
+
+
+def _get_first_hit_per_layer(hits: List[IdentifyHit]) -> List[IdentifyHit]:
+    first_hits = {}
+    for hit in hits:
+        first_hits.setdefault(hit.mLayer.id(), hit)
+    return list(first_hits.values())
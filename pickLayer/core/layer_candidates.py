@@ -0,0 +1,220 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsGeometry,
+    QgsGeometryEngine,
+    QgsPointXY,
+    QgsRectangle,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+
+from pickLayer.core.feature_query import IdentifyHit
+from pickLayer.core.transform_cache import TRANSFORM_CACHE
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+GEOMETRY_TYPE_PREFERENCE = {
+    QgsWkbTypes.PointGeometry: 1,
+    QgsWkbTypes.LineGeometry: 2,
+    QgsWkbTypes.PolygonGeometry: 3,
+}
+OTHER_GEOMETRY_TYPE_PREFERENCE = 99
+
+
+def get_geometry_type_preference(layer: QgsVectorLayer) -> int:
+    return GEOMETRY_TYPE_PREFERENCE.get(
+        layer.geometryType(), OTHER_GEOMETRY_TYPE_PREFERENCE
+    )
+
+
+class LayerCandidate(NamedTuple):
+    """
+    Feature found near a point, ranked by the set active layer rules.
+
+    Candidates are ordered by geometry_type_rank first and distance second.
+    """
+
+    layer_id: str
+    feature_id: int
+    geometry_type_rank: int
+    distance: float  # map units
+
+    @property
+    def sort_key(self) -> tuple:
+        return self.geometry_type_rank, self.distance
+
+
+class ClosestFeature(NamedTuple):
+    """Feature chosen for a point by the batch lookup"""
+
+    layer: QgsVectorLayer
+    feature_id: int
+    distance: float
+
+
+class CandidateScores(NamedTuple):
+    candidates: List[LayerCandidate]
+    skipped_distance_count: int  # exact distances not computed due to pruning
+
+
+def distance_to_rect(point: QgsPointXY, rect: QgsRectangle) -> float:
+    dx = max(rect.xMinimum() - point.x(), 0.0, point.x() - rect.xMaximum())
+    dy = max(rect.yMinimum() - point.y(), 0.0, point.y() - rect.yMaximum())
+    return math.hypot(dx, dy)
+
+
+def _get_lower_bound(feature: QgsFeature, origin: QgsPointXY) -> float:
+    geometry = feature.geometry()
+    if geometry.isNull():
+        return 0.0
+    return distance_to_rect(origin, geometry.boundingBox())
+
+
+def _measure(origin_engine: QgsGeometryEngine, feature: QgsFeature) -> float:
+    geometry = feature.geometry()
+    if geometry.isNull():
+        return -1.0
+    return origin_engine.distance(geometry.constGet())
+
+
+def score_identify_results(
+    results: List[IdentifyHit],
+    origin_map_point: QgsPointXY,
+    map_crs: QgsCoordinateReferenceSystem,
+    best_only: bool = False,
+) -> CandidateScores:
+    """
+    Scores the vector layer identify results into ranked candidates.
+
+    Results are grouped by layer and the origin is transformed and converted
+    to GEOS once per layer.
+    With best_only only the winning candidate is returned, and features that
+    cannot win based on geometry type or bounding box distance are not
+    measured exactly. Ties are won by the result that comes first.
+    """
+    layers: Dict[str, QgsVectorLayer] = {}
+    hits_by_layer: Dict[str, List[Tuple[int, QgsFeature]]] = {}
+    for index, result in enumerate(results):
+        layer = result.mLayer
+        if not isinstance(layer, QgsVectorLayer):
+            continue
+        layers[layer.id()] = layer
+        hits_by_layer.setdefault(layer.id(), []).append((index, result.mFeature))
+
+    scored: List[Tuple[LayerCandidate, int]] = []
+    best: Optional[Tuple[int, float, int]] = None
+    skipped_count = 0
+    for layer_id in sorted(
+        hits_by_layer, key=lambda i: get_geometry_type_preference(layers[i])
+    ):
+        layer = layers[layer_id]
+        hits = hits_by_layer[layer_id]
+        rank = get_geometry_type_preference(layer)
+        if best_only and best is not None and rank > best[0]:
+            skipped_count += len(hits)
+            continue
+
+        for index, feature, distance in _measure_layer_hits(
+            layer, hits, origin_map_point, map_crs, rank, best_only, best
+        ):
+            if distance is None:
+                skipped_count += 1
+                continue
+            if best is None or (rank, distance, index) < best:
+                best = (rank, distance, index)
+            scored.append(
+                (LayerCandidate(layer_id, feature.id(), rank, distance), index)
+            )
+
+    scored.sort(key=lambda item: (*item[0].sort_key, item[1]))
+    candidates = [candidate for candidate, _ in scored]
+    if best_only:
+        candidates = candidates[:1]
+    LOGGER.debug(
+        f"Scored {len(scored)} candidates, "
+        f"skipped {skipped_count} exact distance computations"
+    )
+    return CandidateScores(candidates, skipped_count)
+
+
+def _measure_layer_hits(
+    layer: QgsVectorLayer,
+    hits: List[Tuple[int, QgsFeature]],
+    origin_map_point: QgsPointXY,
+    map_crs: QgsCoordinateReferenceSystem,
+    rank: int,
+    best_only: bool,
+    best: Optional[Tuple[int, float, int]],
+) -> List[Tuple[int, QgsFeature, Optional[float]]]:
+    """
+    Measures distances in map units from the origin to the hits of a layer.
+
+    With best_only the distance is None for the hits that can not beat the
+    best score, otherwise every hit is measured.
+    """
+    origin_layer_point = TRANSFORM_CACHE.transform_point(
+        origin_map_point, map_crs, layer.crs()
+    )
+    origin_geom = QgsGeometry.fromPointXY(origin_layer_point)
+    # Origin is converted to GEOS once for all the hits of the layer
+    origin_engine = QgsGeometry.createGeometryEngine(origin_geom.constGet())
+    origin_engine.prepareGeometry()
+
+    if not TRANSFORM_CACHE.get(map_crs, layer.crs()).isShortCircuited():
+        # Bounding boxes are not in map units, so all hits are measured
+        closest_layer_points = [
+            feature.geometry().nearestPoint(origin_geom).asPoint()
+            for _, feature in hits
+        ]
+        closest_map_points = TRANSFORM_CACHE.transform_points(
+            closest_layer_points, layer.crs(), map_crs
+        )
+        return [
+            (index, feature, origin_map_point.distance(closest_map_point))
+            for (index, feature), closest_map_point in zip(hits, closest_map_points)
+        ]
+
+    if not best_only:
+        return [
+            (index, feature, _measure(origin_engine, feature))
+            for index, feature in hits
+        ]
+
+    bounded_hits = sorted(
+        (_get_lower_bound(feature, origin_layer_point), index, feature)
+        for index, feature in hits
+    )
+    measured = []
+    for bound, index, feature in bounded_hits:
+        if best is not None and (rank, bound, index) > best:
+            measured.append((index, feature, None))
+            continue
+        distance = _measure(origin_engine, feature)
+        if best is None or (rank, distance, index) < best:
+            best = (rank, distance, index)
+        measured.append((index, feature, distance))
+    return measured
@@ -0,0 +1,235 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+from qgis.core import (
+    QgsApplication,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
+
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+T = TypeVar("T")
+
+
+class LayerIndexEntry(Generic[T]):
+    """Index data of a single layer with its build and signal bookkeeping"""
+
+    def __init__(self, layer: QgsVectorLayer) -> None:
+        self.layer = layer
+        self.data: Optional[T] = None
+        self.generation = 0
+        self.task: Optional[QgsTask] = None
+        # Set if the layer changed while the snapshot was being indexed
+        self.stale = False
+        self.connections: List[Tuple[object, Callable]] = []
+
+
+class BackgroundLayerIndex(ABC, Generic[T]):
+    """
+    Base class for per-layer data built in background tasks.
+
+    Subclasses define how the data is built from a feature source snapshot
+    and how it follows feature edits. Data of a layer is rebuilt when the
+    edit buffer is committed or rolled back, and dropped when the layer is
+    removed from the project.
+    """
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[str, LayerIndexEntry[T]]" = OrderedDict()
+        QgsProject.instance().layersWillBeRemoved.connect(self._remove_layers)
+
+    def invalidate(self, layer_id: str) -> None:
+        """Drops the current data of the layer and starts rebuilding it"""
+        entry = self._entries.get(layer_id)
+        if entry is not None:
+            self._build(entry)
+
+    def clear(self) -> None:
+        """Removes the data of all layers and disconnects from the layers"""
+        for layer_id in list(self._entries.keys()):
+            self._remove_layer(layer_id)
+
+    def disconnect(self) -> None:
+        """Clears the data and stops following the project layers"""
+        self.clear()
+        try:
+            QgsProject.instance().layersWillBeRemoved.disconnect(self._remove_layers)
+        except TypeError:
+            # Already disconnected
+            pass
+
+    @abstractmethod
+    def _build_data(
+        self, task: QgsTask, source: QgsVectorLayerFeatureSource, feature_count: int
+    ) -> Optional[T]:
+        """Builds the data in a background thread, None if canceled"""
+
+    @abstractmethod
+    def _task_description(self, layer: QgsVectorLayer) -> str:
+        pass
+
+    @abstractmethod
+    def _build_error_message(self, exception: Exception) -> str:
+        pass
+
+    def _on_data_built(self, entry: LayerIndexEntry[T]) -> None:
+        """Called on the main thread once the data of the layer is ready"""
+
+    @abstractmethod
+    def _add_feature(
+        self, entry: LayerIndexEntry[T], fid: int, geometry: QgsGeometry
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def _delete_feature(self, entry: LayerIndexEntry[T], fid: int) -> None:
+        pass
+
+    @abstractmethod
+    def _change_geometry(
+        self, entry: LayerIndexEntry[T], fid: int, geometry: QgsGeometry
+    ) -> None:
+        pass
+
+    def _add_layer(self, layer: QgsVectorLayer) -> None:
+        entry: LayerIndexEntry[T] = LayerIndexEntry(layer)
+        self._entries[layer.id()] = entry
+
+        layer_id = layer.id()
+        for signal, slot in [
+            (layer.featureAdded, partial(self._on_feature_added, layer_id)),
+            (layer.featureDeleted, partial(self._on_feature_deleted, layer_id)),
+            (layer.geometryChanged, partial(self._on_geometry_changed, layer_id)),
+            # Committing replaces the temporary ids of added features and
+            # rolling back discards the whole edit buffer
+            (layer.afterCommitChanges, partial(self.invalidate, layer_id)),
+            (layer.afterRollBack, partial(self.invalidate, layer_id)),
+            (layer.subsetStringChanged, partial(self.invalidate, layer_id)),
+            (layer.willBeDeleted, partial(self._remove_layer, layer_id)),
+        ]:
+            signal.connect(slot)
+            entry.connections.append((signal, slot))
+
+        self._build(entry)
+
+    def _build(self, entry: LayerIndexEntry[T]) -> None:
+        if entry.task is not None:
+            entry.task.cancel()
+
+        entry.data = None
+        entry.stale = False
+        entry.generation += 1
+
+        layer = entry.layer
+        LOGGER.debug(self._task_description(layer))
+        entry.task = QgsTask.fromFunction(
+            self._task_description(layer),
+            self._build_data,
+            QgsVectorLayerFeatureSource(layer),
+            layer.featureCount(),
+            on_finished=partial(self._on_built, layer.id(), entry.generation),
+            flags=QgsTask.CanCancel,
+        )
+        QgsApplication.taskManager().addTask(entry.task)
+
+    def _on_built(
+        self,
+        layer_id: str,
+        generation: int,
+        exception: Optional[Exception],
+        result: Optional[T] = None,
+    ) -> None:
+        entry = self._entries.get(layer_id)
+        if entry is None or entry.generation != generation:
+            return
+        entry.task = None
+
+        if exception is not None or result is None:
+            if exception is not None:
+                LOGGER.warning(self._build_error_message(exception))
+            self._remove_layer(layer_id)
+            return
+
+        if entry.stale:
+            self._build(entry)
+            return
+
+        entry.data = result
+        self._on_data_built(entry)
+
+    def _remove_layers(self, layer_ids: List[str]) -> None:
+        for layer_id in layer_ids:
+            self._remove_layer(layer_id)
+
+    def _remove_layer(self, layer_id: str) -> None:
+        entry = self._entries.pop(layer_id, None)
+        if entry is None:
+            return
+        if entry.task is not None:
+            entry.task.cancel()
+        for signal, slot in entry.connections:
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                # Layer is already deleted
+                pass
+
+    def _get_ready_entry(self, layer_id: str) -> Optional[LayerIndexEntry[T]]:
+        """Returns the entry if its data is ready, otherwise marks it stale"""
+        entry = self._entries.get(layer_id)
+        if entry is None:
+            return None
+        if entry.data is None:
+            entry.stale = True
+            return None
+        return entry
+
+    def _on_feature_added(self, layer_id: str, fid: int) -> None:
+        entry = self._get_ready_entry(layer_id)
+        if entry is None:
+            return
+        request = QgsFeatureRequest(fid).setNoAttributes()
+        for feature in entry.layer.getFeatures(request):
+            self._add_feature(entry, fid, feature.geometry())
+
+    def _on_feature_deleted(self, layer_id: str, fid: int) -> None:
+        entry = self._get_ready_entry(layer_id)
+        if entry is None:
+            return
+        self._delete_feature(entry, fid)
+
+    def _on_geometry_changed(
+        self, layer_id: str, fid: int, geometry: QgsGeometry
+    ) -> None:
+        entry = self._get_ready_entry(layer_id)
+        if entry is None:
+            return
+        self._change_geometry(entry, fid, geometry)
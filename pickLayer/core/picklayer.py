@@ -20,28 +20,40 @@
 #  You should have received a copy of the GNU General Public License
 #  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
 import logging
+import time
 from functools import partial
-from time import sleep
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 from qgis import core
-from qgis.gui import QgsRubberBand
 from qgis.PyQt import QtGui, QtWidgets
 from qgis.PyQt.QtCore import QUuid
 from qgis.utils import iface, plugins
 
+from pickLayer.core.batch_edit import ChunkedEditJob
+from pickLayer.core.clipboard_model import ClipboardModel
+from pickLayer.core.feature_highlighter import FeatureHighlighter
+from pickLayer.core.geometry_validity_index import GeometryValidityIndex
 from pickLayer.core.identifygeometry import IdentifyGeometry
+from pickLayer.core.profiling import profiled
+from pickLayer.core.spatial_index_cache import SpatialIndexCache
+from pickLayer.core.timing_metrics import TIMING_METRICS, Stage, elapsed_ms
+from pickLayer.core.transform_cache import TRANSFORM_CACHE
 from pickLayer.qgis_plugin_tools.tools.i18n import tr
 from pickLayer.qgis_plugin_tools.tools.messages import MsgBar
 from pickLayer.qgis_plugin_tools.tools.resources import plugin_name, resources_path
 
 LOGGER = logging.getLogger(plugin_name())
 
+ATTRIBUTE_MENU_PAGE_SIZE = 50
+
 
 class PickLayer:
     """QGIS Plugin Implementation."""
 
     def __init__(
         self,
+        spatial_index_cache: Optional[SpatialIndexCache] = None,
+        validity_index: Optional[GeometryValidityIndex] = None,
     ) -> None:
         """Constructor."""
         # Save reference to the QGIS interface
@@ -49,42 +61,87 @@ class PickLayer:
         self.utils = iface.mapCanvas().snappingUtils()
         # initialize plugin directory
         self.cb = QtWidgets.QApplication.clipboard()
+        self.clipboard_model = ClipboardModel(self.cb)
+        self.highlighter = FeatureHighlighter(self.map_canvas)
+        self.batch_job: Optional[ChunkedEditJob] = None
+        self.spatial_index_cache = spatial_index_cache
+        self.validity_index = validity_index
 
-        self.map_tool = IdentifyGeometry(self.map_canvas)
+        self.map_tool = IdentifyGeometry(self.map_canvas, prefetch_on_hover=True)
         self.map_tool.geom_identified.connect(self.edit_feature)
 
         self.clip_tool = IdentifyGeometry(self.map_canvas, layerType="VectorLayer")
         self.clip_tool.geom_identified.connect(self.perform_spatial_function)
 
+    def unload(self) -> None:
+        """Disconnects the map tools and the clipboard and removes highlights"""
+        if self.batch_job is not None:
+            self.batch_job.cancel()
+        self.map_tool.geom_identified.disconnect(self.edit_feature)
+        self.clip_tool.geom_identified.disconnect(self.perform_spatial_function)
+        for map_tool in [self.map_tool, self.clip_tool]:
+            map_tool.unload()
+            # Without deleteLater, the canvas parent would keep them alive until exit
+            map_tool.deleteLater()
+        self.clipboard_model.disconnect()
+        self.highlighter.clear()
+
     def transform_to_current_srs(
-        self, p_point: core.QgsPointXY, srs: int
+        self, p_point: core.QgsPointXY, srs: core.QgsCoordinateReferenceSystem
     ) -> core.QgsPointXY:
         # transformation from provided srs to the current SRS
-        crc_mappa_corrente = (
-            iface.mapCanvas().mapSettings().destinationCrs()
-        )  # get current crs
-        # print crc_mappa_corrente.srsid()
-        crs_dest = crc_mappa_corrente
-        crs_src = core.QgsCoordinateReferenceSystem(srs)
-        xform = core.QgsCoordinateTransform(
-            crs_src, crs_dest, core.QgsProject.instance()
-        )
-        return xform.transform(p_point)  # forward transformation: src -> dest
+        with TIMING_METRICS.measure(Stage.TRANSFORM):
+            return TRANSFORM_CACHE.transform_point(
+                p_point, srs, self.map_canvas.mapSettings().destinationCrs()
+            )
 
-    def transform_to_wgs84(self, p_point: core.QgsPointXY, srs: int) -> core.QgsPointXY:
+    def transform_to_wgs84(
+        self, p_point: core.QgsPointXY, srs: core.QgsCoordinateReferenceSystem
+    ) -> core.QgsPointXY:
         # transformation from the provided SRS to WGS84
-        crs_src = core.QgsCoordinateReferenceSystem(srs)
-        crs_dest = core.QgsCoordinateReferenceSystem(4326)  # WGS 84
-        xform = core.QgsCoordinateTransform(
-            crs_src, crs_dest, core.QgsProject.instance()
-        )
-        return xform.transform(p_point)  # forward transformation: src -> dest
+        with TIMING_METRICS.measure(Stage.TRANSFORM):
+            return TRANSFORM_CACHE.transform_point(
+                p_point, srs, core.QgsCoordinateReferenceSystem("EPSG:4326")
+            )
+
+    def transform_rect_to_current_srs(
+        self, rect: core.QgsRectangle, srs: core.QgsCoordinateReferenceSystem
+    ) -> core.QgsRectangle:
+        # transform both corners in one go
+        with TIMING_METRICS.measure(Stage.TRANSFORM):
+            p1, p2 = TRANSFORM_CACHE.transform_points(
+                [
+                    core.QgsPointXY(rect.xMinimum(), rect.yMinimum()),
+                    core.QgsPointXY(rect.xMaximum(), rect.yMaximum()),
+                ],
+                srs,
+                self.map_canvas.mapSettings().destinationCrs(),
+            )
+        return core.QgsRectangle(p1.x(), p1.y(), p2.x(), p2.y())
 
     def populate_attributes_menu(self, attribute_menu: QtWidgets.QMenu) -> None:
-        field_names = [field.name() for field in self.selected_layer.fields()]
-        for n in range(0, len(field_names)):
+        if not attribute_menu.isEmpty():
+            return
+        self._populate_attributes_page(
+            attribute_menu,
+            self.selected_layer.fields().names(),
+            self.selected_feature.attributes(),
+            0,
+        )
+
+    def _populate_attributes_page(
+        self,
+        attribute_menu: QtWidgets.QMenu,
+        field_names: List[str],
+        attribute_values: List[Any],
+        page_start: int,
+    ) -> None:
+        if not attribute_menu.isEmpty():
+            return
+        page_end = min(page_start + ATTRIBUTE_MENU_PAGE_SIZE, len(field_names))
+        for n in range(page_start, page_end):
             field_name = field_names[n]
-            attribute_value = self.selected_feature.attributes()[n]
+            attribute_value = attribute_values[n]
             try:  # cut long strings
                 self.attribute_action = attribute_menu.addAction(
                     "%s: %s" % (field_name, attribute_value[:40])
@@ -96,8 +153,25 @@ class PickLayer:
             self.attribute_action.triggered.connect(
                 partial(self.copy_to_clipboard, attribute_value)
             )
+        if page_end < len(field_names):
+            more_menu = attribute_menu.addMenu(tr("More…"))
+            more_menu.aboutToShow.connect(
+                partial(
+                    self._populate_attributes_page,
+                    more_menu,
+                    field_names,
+                    attribute_values,
+                    page_end,
+                )
+            )
 
     def context_menu_request(self) -> None:
+        context_menu = self._build_context_menu()
+        context_menu.exec_(QtGui.QCursor.pos())
+
+    @profiled
+    def _build_context_menu(self) -> QtWidgets.QMenu:
+        started_at = time.perf_counter()
         context_menu = QtWidgets.QMenu()
         self.clipboard_layer_action = context_menu.addAction(
             tr("Layer: {}", self.selected_layer.name())
@@ -105,14 +179,11 @@ class PickLayer:
         if self.selected_layer.type() == core.QgsMapLayer.VectorLayer:
             context_menu.addSeparator()
             if self.selected_layer.geometryType() == core.QgsWkbTypes.PointGeometry:
+                feature_point = self.selected_feature.geometry().asPoint()
                 pp = self.transform_to_current_srs(
-                    self.selected_feature.geometry().asPoint(),
-                    self.selected_layer.crs(),
-                )
-                pg = self.transform_to_wgs84(
-                    self.selected_feature.geometry().asPoint(),
-                    self.selected_layer.crs(),
+                    feature_point, self.selected_layer.crs()
                 )
+                pg = self.transform_to_wgs84(feature_point, self.selected_layer.crs())
                 self.lon_lat = str(round(pg.x(), 8)) + "," + str(round(pg.y(), 8))
                 self.xy = str(round(pp.x(), 8)) + "," + str(round(pp.y(), 8))
                 self.clipboard_x_action = context_menu.addAction(
@@ -242,19 +313,11 @@ class PickLayer:
                 self.snapping_options_action.triggered.connect(
                     self.snapping_options_func
                 )
-            if len(QtWidgets.QApplication.clipboard().text().splitlines()) > 1:
-                clip_feat_line_txt = (
-                    QtWidgets.QApplication.clipboard().text().splitlines()[1]
-                )
-                clip_feats_txt = clip_feat_line_txt.split("\t")
-                self.clip_attrs_fieldnames = (
-                    QtWidgets.QApplication.clipboard()
-                    .text()
-                    .splitlines()[0]
-                    .split("\t")[1:]
-                )
-                self.clip_attrs_values = clip_feats_txt[1:]
-                self.clip_geom = core.QgsGeometry.fromWkt(clip_feats_txt[0])
+            clipboard_feature = self.clipboard_model.feature
+            if clipboard_feature is not None:
+                self.clip_attrs_fieldnames = clipboard_feature.field_names
+                self.clip_attrs_values = clipboard_feature.attribute_values
+                self.clip_geom = clipboard_feature.geometry
                 # if self.clip_geom.isGeosValid():
                 if self.selected_layer.isEditable() and self.clip_geom:
                     self.paste_geom_action = context_menu.addAction(
@@ -267,6 +330,17 @@ class PickLayer:
                         tr("Paste attributes on feature"),
                     )
                     self.paste_attrs_action.triggered.connect(self.paste_attrs_func)
+                    if self.selected_layer.selectedFeatureCount() > 0:
+                        self.paste_attrs_on_selection_action = context_menu.addAction(
+                            QtGui.QIcon(resources_path("icons", "pasteIcon.png")),
+                            tr(
+                                "Paste attributes on {} selected features",
+                                self.selected_layer.selectedFeatureCount(),
+                            ),
+                        )
+                        self.paste_attrs_on_selection_action.triggered.connect(
+                            self.paste_attrs_on_selection_func
+                        )
             self.clip_feature_action = context_menu.addAction(
                 QtGui.QIcon(resources_path("icons", "subtractIcon.png")),
                 tr("Select feature and Subtract"),
@@ -279,6 +353,35 @@ class PickLayer:
             )
             self.merge_feature_action.triggered.connect(self.merge_feature_func)
             self.merge_feature_action.setEnabled(self.selected_layer.isEditable())
+            selected_count = len(self._get_other_selected_feature_ids())
+            if selected_count > 0:
+                self.subtract_from_selection_action = context_menu.addAction(
+                    QtGui.QIcon(resources_path("icons", "subtractIcon.png")),
+                    tr("Subtract from {} selected features", selected_count),
+                )
+                self.subtract_from_selection_action.triggered.connect(
+                    self.subtract_from_selection_func
+                )
+                self.subtract_from_selection_action.setEnabled(
+                    self.selected_layer.isEditable()
+                )
+                self.merge_selection_action = context_menu.addAction(
+                    QtGui.QIcon(resources_path("icons", "mergeIcon.png")),
+                    tr("Merge {} selected features", selected_count),
+                )
+                self.merge_selection_action.triggered.connect(self.merge_selection_func)
+                self.merge_selection_action.setEnabled(self.selected_layer.isEditable())
+            if self.selected_layer.geometryType() == core.QgsWkbTypes.PolygonGeometry:
+                self.subtract_from_overlapping_action = context_menu.addAction(
+                    QtGui.QIcon(resources_path("icons", "subtractIcon.png")),
+                    tr("Subtract from all overlapping features in this layer"),
+                )
+                self.subtract_from_overlapping_action.triggered.connect(
+                    self.subtract_from_overlapping_func
+                )
+                self.subtract_from_overlapping_action.setEnabled(
+                    self.selected_layer.isEditable()
+                )
             self.make_valid_feature_action = context_menu.addAction(
                 QtGui.QIcon(resources_path("icons", "makeValidIcon.png")),
                 tr("Make Valid Geometry"),
@@ -286,7 +389,21 @@ class PickLayer:
             self.make_valid_feature_action.triggered.connect(
                 self.make_valid_feature_func
             )
-            self.make_valid_feature_action.setEnabled(self.selected_layer.isEditable())
+            self.make_valid_feature_action.setEnabled(
+                self.selected_layer.isEditable() and not self._is_feature_valid()
+            )
+            invalid_ids = (
+                self.validity_index.invalid_ids(self.selected_layer)
+                if self.validity_index is not None
+                else None
+            )
+            if invalid_ids:
+                self.make_all_valid_action = context_menu.addAction(
+                    QtGui.QIcon(resources_path("icons", "makeValidIcon.png")),
+                    tr("Make all {} invalid geometries valid", len(invalid_ids)),
+                )
+                self.make_all_valid_action.triggered.connect(self.make_all_valid_func)
+                self.make_all_valid_action.setEnabled(self.selected_layer.isEditable())
             self.copy_feature_action = context_menu.addAction(
                 QtGui.QIcon(resources_path("icons", "copyIcon.png")),
                 tr("Copy feature"),
@@ -296,7 +413,9 @@ class PickLayer:
                 QtGui.QIcon(resources_path("icons", "viewAttributes.png")),
                 tr("Feature attributes view"),
             )
-            self.populate_attributes_menu(self.attribute_menu)
+            self.attribute_menu.aboutToShow.connect(
+                partial(self.populate_attributes_menu, self.attribute_menu)
+            )
             self.edit_feature_action = context_menu.addAction(
                 QtGui.QIcon(resources_path("icons", "mActionPropertyItem.png")),
                 tr("Feature attributes edit"),
@@ -317,32 +436,26 @@ class PickLayer:
                         partial(self.custom_action, action.id())
                     )
                     action_order += 1
-        context_menu.exec_(QtGui.QCursor.pos())
+        TIMING_METRICS.record(
+            Stage.MENU, elapsed_ms(started_at), self.selected_layer.providerType()
+        )
+        return context_menu
 
     def zoom_to_feature_func(self) -> None:
-        feature_box = self.selected_feature.geometry().boundingBox()
-        p1 = self.transform_to_current_srs(
-            core.QgsPointXY(feature_box.xMinimum(), feature_box.yMinimum()),
-            self.selected_layer.crs(),
-        )
-        p2 = self.transform_to_current_srs(
-            core.QgsPointXY(feature_box.xMaximum(), feature_box.yMaximum()),
-            self.selected_layer.crs(),
+        self.map_canvas.setExtent(
+            self.transform_rect_to_current_srs(
+                self.selected_feature.geometry().boundingBox(),
+                self.selected_layer.crs(),
+            )
         )
-        self.map_canvas.setExtent(core.QgsRectangle(p1.x(), p1.y(), p2.x(), p2.y()))
         self.map_canvas.refresh()
 
     def zoom_to_layer_func(self) -> None:
-        layer_box = self.selected_layer.extent()
-        p1 = self.transform_to_current_srs(
-            core.QgsPointXY(layer_box.xMinimum(), layer_box.yMinimum()),
-            self.selected_layer.crs(),
-        )
-        p2 = self.transform_to_current_srs(
-            core.QgsPointXY(layer_box.xMaximum(), layer_box.yMaximum()),
-            self.selected_layer.crs(),
+        self.map_canvas.setExtent(
+            self.transform_rect_to_current_srs(
+                self.selected_layer.extent(), self.selected_layer.crs()
+            )
         )
-        self.map_canvas.setExtent(core.QgsRectangle(p1.x(), p1.y(), p2.x(), p2.y()))
         self.map_canvas.refresh()
 
     def set_active_func(self) -> None:
@@ -426,13 +539,74 @@ class PickLayer:
         self.selected_layer.triggerRepaint()
 
     def paste_attrs_func(self) -> None:
-        for attr_id in range(0, len(self.clip_attrs_values)):
-            if self.selected_layer.pendingFields().field(
-                str(self.clip_attrs_fieldnames[attr_id])
+        self.paste_attributes([self.selected_feature.id()])
+
+    def paste_attrs_on_selection_func(self) -> None:
+        self.paste_attributes(self.selected_layer.selectedFeatureIds())
+
+    def paste_attributes(self, feature_ids: List[int]) -> None:
+        """
+        Pastes clipboard attributes to the features as a single edit command.
+
+        Clipboard columns are matched to the layer fields by name.
+        """
+        new_values = self._get_clipboard_attribute_values()
+        if not new_values:
+            MsgBar.warning(tr("Clipboard has no fields matching the layer"))
+            return
+
+        self.selected_layer.beginEditCommand(tr("Paste attributes"))
+        try:
+            for feature_id in feature_ids:
+                self.selected_layer.changeAttributeValues(feature_id, new_values)
+        except Exception:
+            self.selected_layer.destroyEditCommand()
+            raise
+        self.selected_layer.endEditCommand()
+        self.selected_layer.triggerRepaint()
+
+    def _get_clipboard_attribute_values(self) -> Dict[int, Any]:
+        """
+        Returns the clipboard values of the editable layer fields by index.
+
+        Primary key and read-only fields are skipped, pasting the key of the
+        copied feature on the selection would give all of them the same key.
+        """
+        fields = self.selected_layer.fields()
+        primary_keys = set(self.selected_layer.primaryKeyAttributes())
+        new_values = {}
+        for field_name, value in zip(
+            self.clip_attrs_fieldnames, self.clip_attrs_values
+        ):
+            field_index = fields.lookupField(field_name)
+            if (
+                field_index == -1
+                or field_index in primary_keys
+                or self._is_read_only_field(field_index)
             ):
-                self.selected_layer.changeAttributeValue(
-                    self.selected_feature.id(), attr_id, self.clip_attrs_values[attr_id]
+                continue
+            if value == "NULL":
+                new_values[field_index] = None
+                continue
+            try:
+                new_values[field_index] = fields.at(field_index).convertCompatible(
+                    value
+                )
+            except ValueError:
+                LOGGER.warning(
+                    tr("Could not paste value {} to field {}", value, field_name)
                 )
+        return new_values
+
+    def _is_read_only_field(self, field_index: int) -> bool:
+        return (
+            self.selected_layer.fields().fieldOrigin(field_index)
+            in (
+                core.QgsFields.OriginJoin,
+                core.QgsFields.OriginExpression,
+            )
+            or self.selected_layer.editFormConfig().readOnly(field_index)
+        )
 
     def edit_feature(self, layer: core.QgsMapLayer, feature: core.QgsFeature) -> None:
         self.selected_layer = layer
@@ -444,27 +618,10 @@ class PickLayer:
         self.map_canvas.setMapTool(self.map_tool)
 
     def highlight(self, geometry: core.QgsGeometry) -> None:
-        def process_events() -> None:
-            try:
-                QtGui.qApp.processEvents()
-            except Exception:
-                QtWidgets.QApplication.processEvents()
-
-        highlight = QgsRubberBand(iface.mapCanvas(), geometry.type())
-        highlight.setColor(QtGui.QColor("#36AF6C"))
-        highlight.setFillColor(QtGui.QColor("#36AF6C"))
-        highlight.setWidth(2)
-        highlight.setToGeometry(geometry, self.selected_layer)
-        process_events()
-        sleep(0.1)
-        highlight.hide()
-        process_events()
-        sleep(0.1)
-        highlight.show()
-        process_events()
-        sleep(0.1)
-        highlight.reset()
-        process_events()
+        with TIMING_METRICS.measure(
+            Stage.HIGHLIGHT, self.selected_layer.providerType()
+        ):
+            self.highlighter.flash(geometry, self.selected_layer)
 
     def clip_feature_func(self) -> None:
         self.spatial_function = self.selected_feature.geometry().difference
@@ -476,15 +633,205 @@ class PickLayer:
         self.spatial_predicate = "merged"
         self.map_canvas.setMapTool(self.clip_tool)
 
+    def subtract_from_selection_func(self) -> None:
+        """Subtracts the picked geometry from every selected feature"""
+        self._start_batch_job(
+            tr("Subtract from selected features"),
+            self._get_other_selected_features(),
+            len(self._get_other_selected_feature_ids()),
+            self._create_subtract_function(),
+        )
+
+    def subtract_from_overlapping_func(self) -> None:
+        """Subtracts the picked geometry from all overlapping features of the layer"""
+        candidate_ids = self._get_overlapping_candidate_ids()
+        self._start_batch_job(
+            tr("Subtract from overlapping features"),
+            self.selected_layer.getFeatures(
+                core.QgsFeatureRequest().setFilterFids(candidate_ids).setNoAttributes()
+            ),
+            len(candidate_ids),
+            self._create_subtract_function(),
+        )
+
+    def _get_overlapping_candidate_ids(self) -> List[int]:
+        """Ids of the features whose bounding box intersects the picked feature"""
+        bounding_box = self.selected_feature.geometry().boundingBox()
+        candidate_ids = (
+            self.spatial_index_cache.ids_in_rect(self.selected_layer, bounding_box)
+            if self.spatial_index_cache is not None
+            else None
+        )
+        if candidate_ids is None:
+            request = (
+                core.QgsFeatureRequest()
+                .setFilterRect(bounding_box)
+                .setNoAttributes()
+                .setFlags(core.QgsFeatureRequest.NoGeometry)
+            )
+            candidate_ids = [
+                feature.id() for feature in self.selected_layer.getFeatures(request)
+            ]
+        return [
+            feature_id
+            for feature_id in candidate_ids
+            if feature_id != self.selected_feature.id()
+        ]
+
+    def _create_subtract_function(self) -> Callable[[core.QgsFeature], None]:
+        """
+        Creates a function that subtracts the picked geometry from a feature.
+
+        The picked geometry is prepared once, so testing it against many
+        features is cheap. Overlap is tested with a single relate call, which
+        converts the feature geometry to GEOS only once for the test.
+        """
+        clip_geometry = self.selected_feature.geometry()
+        clip_engine = core.QgsGeometry.createGeometryEngine(clip_geometry.constGet())
+        clip_engine.prepareGeometry()
+        layer = self.selected_layer
+
+        def subtract(feature: core.QgsFeature) -> None:
+            geometry = feature.geometry()
+            # Interiors intersect, that is intersects but does not only touch
+            if not clip_engine.relatePattern(geometry.constGet(), "T********"):
+                return
+            clipped_geometry = geometry.difference(clip_geometry)
+            if clipped_geometry.isNull() or clipped_geometry.isEmpty():
+                LOGGER.warning(
+                    tr("Feature {} would be removed entirely, skipping", feature.id())
+                )
+                return
+            layer.changeGeometry(feature.id(), clipped_geometry)
+
+        return subtract
+
+    def merge_selection_func(self) -> None:
+        """Merges every selected feature into the picked one"""
+        merged_feature_id = self.selected_feature.id()
+        geometries = [self.selected_feature.geometry()]
+        merged_ids = []
+        layer = self.selected_layer
+
+        def collect(feature: core.QgsFeature) -> None:
+            geometries.append(feature.geometry())
+            merged_ids.append(feature.id())
+
+        def merge() -> None:
+            merged_geometry = core.QgsGeometry.unaryUnion(geometries)
+            if merged_geometry.isNull():
+                raise ValueError(tr("Invalid processed geometry"))
+            layer.changeGeometry(merged_feature_id, merged_geometry)
+            layer.deleteFeatures(merged_ids)
+
+        self._start_batch_job(
+            tr("Merge selected features"),
+            self._get_other_selected_features(),
+            len(self._get_other_selected_feature_ids()),
+            collect,
+            merge,
+        )
+
+    def _get_other_selected_feature_ids(self) -> List[int]:
+        return [
+            feature_id
+            for feature_id in self.selected_layer.selectedFeatureIds()
+            if feature_id != self.selected_feature.id()
+        ]
+
+    def _get_other_selected_features(self) -> core.QgsFeatureIterator:
+        return self.selected_layer.getFeatures(
+            core.QgsFeatureRequest()
+            .setFilterFids(self._get_other_selected_feature_ids())
+            .setNoAttributes()
+        )
+
+    def _start_batch_job(
+        self,
+        description: str,
+        features: Iterable[core.QgsFeature],
+        feature_count: int,
+        process_feature: Callable[[core.QgsFeature], None],
+        finalize: Optional[Callable[[], None]] = None,
+    ) -> None:
+        if self.batch_job is not None and self.batch_job.is_running():
+            MsgBar.warning(tr("Previous operation is still running"))
+            return
+        self.batch_job = ChunkedEditJob(
+            self.selected_layer,
+            description,
+            features,
+            feature_count,
+            process_feature,
+            finalize,
+        )
+        self.batch_job.finished.connect(
+            partial(
+                self._batch_job_finished,
+                description,
+                self.selected_layer,
+                self.selected_feature.id(),
+            )
+        )
+        self.batch_job.start()
+
+    def _batch_job_finished(
+        self,
+        description: str,
+        layer: core.QgsVectorLayer,
+        feature_id: int,
+        completed: bool,
+    ) -> None:
+        if completed:
+            MsgBar.info(tr("{} finished", description), success=True)
+            self.highlighter.flash(layer.getFeature(feature_id).geometry(), layer)
+
     def make_valid_feature_func(self) -> None:
+        if self._is_feature_valid():
+            MsgBar.info(tr("Geometry is already valid"))
+            return
         valid_geometry = self.selected_feature.geometry().makeValid()
         self.selected_feature.setGeometry(valid_geometry)
         self.selected_layer.updateFeature(self.selected_feature)
         self.selected_layer.triggerRepaint()
         self.highlight(self.selected_feature.geometry())
 
+    def make_all_valid_func(self) -> None:
+        """Makes all the invalid geometries of the layer valid"""
+        invalid_ids = sorted(self.validity_index.invalid_ids(self.selected_layer))
+        layer = self.selected_layer
+
+        def make_valid(feature: core.QgsFeature) -> None:
+            layer.changeGeometry(feature.id(), feature.geometry().makeValid())
+
+        self._start_batch_job(
+            tr("Make invalid geometries valid"),
+            layer.getFeatures(
+                core.QgsFeatureRequest().setFilterFids(invalid_ids).setNoAttributes()
+            ),
+            len(invalid_ids),
+            make_valid,
+        )
+
+    def _is_feature_valid(self) -> bool:
+        if self.validity_index is not None:
+            return self.validity_index.is_valid(
+                self.selected_layer, self.selected_feature
+            )
+        return self.selected_feature.geometry().isGeosValid()
+
+    @profiled
     def perform_spatial_function(
         self, clip_layer: core.QgsVectorLayer, clip_feature: core.QgsFeature
+    ) -> None:
+        with TIMING_METRICS.measure(
+            Stage.SPATIAL_OPERATION, self.selected_layer.providerType()
+        ):
+            self._perform_spatial_function(clip_layer, clip_feature)
+        self.map_canvas.setMapTool(self.map_tool)
+
+    def _perform_spatial_function(
+        self, clip_layer: core.QgsVectorLayer, clip_feature: core.QgsFeature
     ) -> None:
         if clip_feature.geometry().type() != self.selected_feature.geometry().type():
             MsgBar.warning(
@@ -508,5 +855,3 @@ class PickLayer:
                 self.highlight(clipped_geometry)
             else:
                 MsgBar.warning(tr("Invalid processed geometry"))
-
-        self.map_canvas.setMapTool(self.map_tool)
@@ -0,0 +1,89 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import cProfile
+import logging
+import os
+import re
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from pickLayer.qgis_plugin_tools.tools.custom_logging import get_log_folder
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+# Set to "cprofile" to profile the map tool handlers, read once on import
+PROFILER = os.environ.get("QGIS_PLUGIN_USE_PROFILER", "").lower()
+# Profiles kept in the log folder, oldest ones are removed
+PROFILE_FILE_COUNT = 20
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+_profile_running = False
+
+
+def get_profile_folder() -> Path:
+    return get_log_folder() / "profiles"
+
+
+def profiled(function: _F) -> _F:
+    """
+    Profiles every call of the function with cProfile if profiling is enabled.
+
+    Profiles are written as .pstats files to the profile folder. Calls made
+    while another profiled call is running are part of the outer profile.
+    Without profiling the function is returned as is.
+    """
+    if PROFILER != "cprofile":
+        return function
+
+    @wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        global _profile_running
+        if _profile_running:
+            return function(*args, **kwargs)
+
+        _profile_running = True
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args, **kwargs)
+        finally:
+            _profile_running = False
+            _save_profile(profile, function.__qualname__)
+
+    return wrapper  # type: ignore
+
+
+def _save_profile(profile: cProfile.Profile, name: str) -> None:
+    folder = get_profile_folder()
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        file_name = re.sub(r"[^\w.]", "_", name)
+        path = folder / f"{file_name}_{datetime.now():%Y%m%d_%H%M%S_%f}.pstats"
+        profile.dump_stats(str(path))
+        for old_path in sorted(
+            folder.glob("*.pstats"), key=lambda p: p.stat().st_mtime
+        )[:-PROFILE_FILE_COUNT]:
+            old_path.unlink()
+    except OSError as e:
+        LOGGER.warning(f"Could not save profile of {name}: {e}")
+        return
+    LOGGER.debug(f"Profile of {name} saved to {path}")
@@ -19,22 +19,50 @@
 #  You should have received a copy of the GNU General Public License
 #  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
 import logging
-from typing import List, Optional
+import math
+import time
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 from qgis.core import (
+    QgsCoordinateReferenceSystem,
     QgsFeature,
     QgsGeometry,
+    QgsGeometryEngine,
     QgsMapLayer,
     QgsPointXY,
-    QgsRenderContext,
+    QgsRectangle,
+    QgsSpatialIndex,
     QgsVectorLayer,
-    QgsWkbTypes,
 )
 from qgis.gui import QgsMapCanvas, QgsMapMouseEvent, QgsMapTool, QgsMapToolIdentify
-from qgis.PyQt.QtCore import QPoint
-from qgis.PyQt.QtGui import QCursor
+from qgis.PyQt.QtCore import QPoint, Qt
+from qgis.PyQt.QtGui import QCursor, QKeyEvent
 from qgis.utils import iface
 
+from pickLayer.core.feature_query import (
+    IdentifyHit,
+    LayerQuery,
+    LayerSearch,
+    TieredLayerSearch,
+    get_identifiable_vector_layers,
+    get_search_rect,
+    renderer_filters_features,
+    search_radius_to_map_units,
+)
+from pickLayer.core.hover_preview import HoverPreview
+from pickLayer.core.layer_candidates import (
+    OTHER_GEOMETRY_TYPE_PREFERENCE,
+    ClosestFeature,
+    LayerCandidate,
+    distance_to_rect,
+    get_geometry_type_preference,
+    score_identify_results,
+)
+from pickLayer.core.profiling import profiled
+from pickLayer.core.spatial_index_cache import SpatialIndexCache
+from pickLayer.core.timing_metrics import TIMING_METRICS, Stage, elapsed_ms
+from pickLayer.core.transform_cache import TRANSFORM_CACHE
 from pickLayer.definitions.settings import Settings
 from pickLayer.qgis_plugin_tools.tools.i18n import tr
 from pickLayer.qgis_plugin_tools.tools.messages import MsgBar
@@ -43,6 +71,83 @@ from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
 LOGGER = logging.getLogger(plugin_name())
 
 
+class _LayerDistances:
+    """
+    Distances in map units from points to the features of a single layer.
+
+    Features shared by nearby points are converted to GEOS and bounded only
+    once, and exact distances are skipped for the features that can not beat
+    the closest one found so far.
+    """
+
+    def __init__(
+        self, layer: QgsVectorLayer, map_crs: QgsCoordinateReferenceSystem
+    ) -> None:
+        self._layer_crs = layer.crs()
+        self._map_crs = map_crs
+        self._short_circuited = TRANSFORM_CACHE.get(
+            map_crs, self._layer_crs
+        ).isShortCircuited()
+        self._bounds: Dict[int, QgsRectangle] = {}
+        self._engines: Dict[int, QgsGeometryEngine] = {}
+
+    def closest(
+        self,
+        map_point: QgsPointXY,
+        layer_point: QgsPointXY,
+        features: List[QgsFeature],
+        max_distance: float,
+    ) -> Optional[Tuple[QgsFeature, float]]:
+        """
+        Returns the closest feature if it is closer than max_distance.
+
+        Ties are won by the feature that comes first.
+        """
+        bounded_features = sorted(
+            (distance_to_rect(map_point, self._get_map_bounds(feature)), i)
+            for i, feature in enumerate(features)
+        )
+        origin_geom = QgsGeometry.fromPointXY(layer_point)
+        closest: Optional[Tuple[float, int]] = None
+        for bound, i in bounded_features:
+            if bound > (closest[0] if closest is not None else max_distance):
+                break
+            distance = self._measure(map_point, origin_geom, features[i])
+            if (closest is None and distance < max_distance) or (
+                closest is not None and (distance, i) < closest
+            ):
+                closest = (distance, i)
+        if closest is None:
+            return None
+        return features[closest[1]], closest[0]
+
+    def _get_map_bounds(self, feature: QgsFeature) -> QgsRectangle:
+        if feature.id() not in self._bounds:
+            bounds = feature.geometry().boundingBox()
+            if not self._short_circuited:
+                bounds = TRANSFORM_CACHE.transform_bounding_box(
+                    bounds, self._layer_crs, self._map_crs
+                )
+            self._bounds[feature.id()] = bounds
+        return self._bounds[feature.id()]
+
+    def _measure(
+        self, map_point: QgsPointXY, origin_geom: QgsGeometry, feature: QgsFeature
+    ) -> float:
+        if not self._short_circuited:
+            closest_point = feature.geometry().nearestPoint(origin_geom).asPoint()
+            return map_point.distance(
+                TRANSFORM_CACHE.transform_point(
+                    closest_point, self._layer_crs, self._map_crs
+                )
+            )
+        if feature.id() not in self._engines:
+            engine = QgsGeometry.createGeometryEngine(feature.geometry().constGet())
+            engine.prepareGeometry()
+            self._engines[feature.id()] = engine
+        return self._engines[feature.id()].distance(origin_geom.constGet())
+
+
 class SetActiveLayerTool(QgsMapToolIdentify):
     """
     Map tool that sets active layer by a click on the map canvas.
@@ -57,14 +162,46 @@ class SetActiveLayerTool(QgsMapToolIdentify):
     def __init__(
         self,
         canvas: QgsMapCanvas,
+        spatial_index_cache: Optional[SpatialIndexCache] = None,
     ) -> None:
         super().__init__(canvas)
         self.setCursor(QCursor())
         self.previous_map_tool: Optional[QgsMapTool] = None
+        self.spatial_index_cache = spatial_index_cache
+        self.pending_search: Optional[TieredLayerSearch] = None
+        self.hover_preview: Optional[HoverPreview] = None
+
+    def canvasMoveEvent(self, mouse_event: QgsMapMouseEvent) -> None:  # noqa N802
+        if not Settings.hover_preview.get(typehint=bool):
+            return
+        if self.hover_preview is None:
+            self.hover_preview = HoverPreview(
+                self.canvas(), self._create_search, self._get_default_search_radius
+            )
+        self.hover_preview.cursor_moved(
+            self.toMapCoordinates(QPoint(mouse_event.x(), mouse_event.y()))
+        )
+
+    def deactivate(self) -> None:
+        if self.hover_preview is not None:
+            self.hover_preview.hide()
+        super().deactivate()
 
+    def unload(self) -> None:
+        """Cancels the running search and disconnects from the canvas"""
+        if self.pending_search is not None:
+            self.pending_search.cancel()
+        if self.hover_preview is not None:
+            self.hover_preview.unload()
+            self.hover_preview = None
+        self.previous_map_tool = None
+        if self.canvas().mapTool() is self:
+            self.canvas().unsetMapTool(self)
+
+    @profiled
     def canvasReleaseEvent(self, mouse_event: QgsMapMouseEvent) -> None:  # noqa N802
         try:
-            self.set_active_layer_using_closest_feature(
+            self._start_click_search(
                 self.toMapCoordinates(QPoint(mouse_event.x(), mouse_event.y()))
             )
         except Exception as e:
@@ -72,6 +209,14 @@ class SetActiveLayerTool(QgsMapToolIdentify):
                 tr("Error occurred: {}", str(e)), tr("Check log for more details.")
             )
 
+    def keyPressEvent(self, key_event: QKeyEvent) -> None:  # noqa N802
+        if key_event.key() == Qt.Key_Escape and self.pending_search is not None:
+            LOGGER.info(tr("Search canceled"))
+            self.pending_search.cancel()
+            key_event.accept()
+            return
+        key_event.ignore()
+
     def set_active_layer_using_closest_feature(
         self, location: QgsPointXY, search_radius: Optional[float] = None
     ) -> None:
@@ -79,15 +224,7 @@ class SetActiveLayerTool(QgsMapToolIdentify):
         if search_radius is None:
             search_radius = self._get_default_search_radius()
 
-        self.setCanvasPropertiesOverrides(search_radius)
-
-        results = self.identify(
-            geometry=QgsGeometry.fromPointXY(location),
-            mode=QgsMapToolIdentify.TopDownAll,
-            layerType=QgsMapToolIdentify.VectorLayer,
-        )
-
-        self.restoreCanvasPropertiesOverrides()
+        results = self._identify_candidates(location, search_radius, tiered=True)
 
         layer_to_activate = self._choose_layer_from_identify_results(results, location)
 
@@ -95,6 +232,240 @@ class SetActiveLayerTool(QgsMapToolIdentify):
             LOGGER.info(tr("Activating layer {}", layer_to_activate.name()))
             self._activate_layer_and_previous_map_tool(layer_to_activate)
 
+    def _start_click_search(self, location: QgsPointXY) -> None:
+        """
+        Searches the features under the click without blocking the event loop.
+
+        A click while the previous search is still running replaces it, so
+        quick repeated clicks result in one search.
+        """
+        if self.pending_search is not None:
+            self.pending_search.cancel()
+
+        started_at = time.perf_counter()
+        search = self._create_tiered_search(location, self._get_default_search_radius())
+        search.finished.connect(
+            partial(self._on_click_search_finished, search, location, started_at)
+        )
+        self.pending_search = search
+        search.start()
+
+    @profiled
+    def _on_click_search_finished(
+        self, search: TieredLayerSearch, location: QgsPointXY, started_at: float
+    ) -> None:
+        if search is self.pending_search:
+            self.pending_search = None
+        if search.canceled:
+            return
+        TIMING_METRICS.record(Stage.IDENTIFY, elapsed_ms(started_at))
+
+        try:
+            layer_to_activate = self._choose_layer_from_identify_results(
+                search.hits(), location
+            )
+            self._warn_if_skipped_layers_matter(
+                layer_to_activate, search.skipped_layers
+            )
+            provider = ""
+            if layer_to_activate is not None:
+                LOGGER.info(tr("Activating layer {}", layer_to_activate.name()))
+                self._activate_layer_and_previous_map_tool(layer_to_activate)
+                provider = layer_to_activate.providerType()
+            TIMING_METRICS.record(Stage.CLICK, elapsed_ms(started_at), provider)
+        except Exception as e:
+            MsgBar.exception(
+                tr("Error occurred: {}", str(e)), tr("Check log for more details.")
+            )
+
+    def _warn_if_skipped_layers_matter(
+        self,
+        chosen_layer: Optional[QgsVectorLayer],
+        skipped_layers: List[QgsVectorLayer],
+    ) -> None:
+        """Partial results are used, but warns if a skipped layer could have won"""
+        chosen_preference = (
+            get_geometry_type_preference(chosen_layer)
+            if chosen_layer is not None
+            else OTHER_GEOMETRY_TYPE_PREFERENCE
+        )
+        contenders = [
+            layer.name()
+            for layer in skipped_layers
+            if get_geometry_type_preference(layer) <= chosen_preference
+        ]
+        if contenders:
+            MsgBar.warning(
+                tr("Layers did not answer in time"),
+                tr("Skipped layers: {}", ", ".join(contenders)),
+            )
+
+    def find_candidates(
+        self, location: QgsPointXY, search_radius: Optional[float] = None
+    ) -> List[LayerCandidate]:
+        """
+        Finds the features near the location ranked by the layer preference.
+
+        Does not change the active layer or the map tool. First candidate is
+        the one set_active_layer_using_closest_feature would activate.
+
+        Args:
+            location: Map coordinates
+            search_radius: Search radius to use in map units. By default uses
+              search radius defined in PickLayer settings.
+        """
+        if search_radius is None:
+            search_radius = self._get_default_search_radius()
+
+        results = self._identify_candidates(location, search_radius)
+        return self._rank_identify_results(results, location)
+
+    def find_closest_features(
+        self,
+        points: Iterable[Sequence[float]],
+        search_radius: Optional[float] = None,
+    ) -> List[Optional[ClosestFeature]]:
+        """
+        Finds the feature this tool would choose for each of the points.
+
+        Does not change the active layer or the map tool. Each layer is
+        queried once over the combined search area of the points, skipping
+        the features its renderer hides like a click does. Exact distances
+        are computed only for the features whose bounding box is close enough
+        to beat the best match so far.
+
+        Args:
+            points: Map coordinates as QgsPointXY's, (x, y) pairs or a NumPy
+              array of shape (N, 2)
+            search_radius: Search radius to use in map units. By default uses
+              search radius defined in PickLayer settings.
+
+        Returns:
+            Closest feature for each of the points, None if nothing was found.
+        """
+        if search_radius is None:
+            search_radius = self._get_default_search_radius()
+
+        map_points = [QgsPointXY(float(x), float(y)) for x, y in points]
+        best_matches: List[Optional[ClosestFeature]] = [None] * len(map_points)
+        best_preferences = [OTHER_GEOMETRY_TYPE_PREFERENCE + 1] * len(map_points)
+
+        for layer in self._get_identifiable_vector_layers():
+            preference = get_geometry_type_preference(layer)
+            # Points that already have a match of a preferred type are done
+            point_indices = [
+                i
+                for i, best_preference in enumerate(best_preferences)
+                if best_preference >= preference
+            ]
+            if not point_indices:
+                continue
+
+            layer_points, search_rects = self._get_layer_search_rects(
+                layer, [map_points[i] for i in point_indices], search_radius
+            )
+            features_per_point = self._get_features_in_rects(layer, search_rects)
+            distances = _LayerDistances(
+                layer, self.canvas().mapSettings().destinationCrs()
+            )
+            for i, layer_point, features in zip(
+                point_indices, layer_points, features_per_point
+            ):
+                best_match = best_matches[i]
+                max_distance = (
+                    best_match.distance
+                    if best_match is not None and best_preferences[i] == preference
+                    else math.inf
+                )
+                closest = distances.closest(
+                    map_points[i], layer_point, features, max_distance
+                )
+                if closest is not None:
+                    feature, distance = closest
+                    best_matches[i] = ClosestFeature(layer, feature.id(), distance)
+                    best_preferences[i] = preference
+
+        return best_matches
+
+    def _get_layer_search_rects(
+        self,
+        layer: QgsVectorLayer,
+        map_points: List[QgsPointXY],
+        search_radius: float,
+    ) -> Tuple[List[QgsPointXY], List[QgsRectangle]]:
+        """Returns the points and their search rectangles in layer crs"""
+        map_crs = self.canvas().mapSettings().destinationCrs()
+        corners = []
+        for point in map_points:
+            corners.extend(
+                [
+                    QgsPointXY(point.x() - search_radius, point.y() - search_radius),
+                    QgsPointXY(point.x() - search_radius, point.y() + search_radius),
+                    QgsPointXY(point.x() + search_radius, point.y() - search_radius),
+                    QgsPointXY(point.x() + search_radius, point.y() + search_radius),
+                ]
+            )
+        with TIMING_METRICS.measure(Stage.TRANSFORM):
+            transformed_points = TRANSFORM_CACHE.transform_points(
+                map_points + corners, map_crs, layer.crs()
+            )
+        layer_points = transformed_points[: len(map_points)]
+        layer_corners = transformed_points[len(map_points) :]
+
+        search_rects = []
+        for i in range(len(map_points)):
+            search_rect = QgsRectangle(layer_corners[4 * i], layer_corners[4 * i + 1])
+            for corner in layer_corners[4 * i + 2 : 4 * i + 4]:
+                search_rect.combineExtentWith(corner)
+            search_rects.append(search_rect)
+        return layer_points, search_rects
+
+    def _get_features_in_rects(
+        self, layer: QgsVectorLayer, search_rects: List[QgsRectangle]
+    ) -> List[List[QgsFeature]]:
+        """
+        Returns the features intersecting each of the rectangles in layer crs.
+
+        Uses the spatial index cache if it can be used for the layer.
+        Otherwise the visible features of the combined extent are fetched
+        with a single request and indexed temporarily.
+        """
+        if not search_rects:
+            return []
+        features = self._get_cached_features(layer, search_rects[0])
+        if features is not None:
+            return [features] + [
+                self._get_cached_features(layer, search_rect) or []
+                for search_rect in search_rects[1:]
+            ]
+
+        extent = QgsRectangle(search_rects[0])
+        for search_rect in search_rects[1:]:
+            extent.combineExtentWith(search_rect)
+        features = LayerQuery(
+            layer, extent, self.canvas().mapSettings(), limit=None
+        ).run()
+
+        index = QgsSpatialIndex()
+        features_by_id: Dict[int, QgsFeature] = {}
+        order: Dict[int, int] = {}
+        for position, feature in enumerate(features):
+            index.addFeature(feature)
+            features_by_id[feature.id()] = feature
+            order[feature.id()] = position
+
+        features_per_rect = []
+        for search_rect in search_rects:
+            rect_geometry = QgsGeometry.fromRect(search_rect)
+            features_per_rect.append(
+                [
+                    features_by_id[fid]
+                    for fid in sorted(index.intersects(search_rect), key=order.get)
+                    if features_by_id[fid].geometry().intersects(rect_geometry)
+                ]
+            )
+        return features_per_rect
+
     def _activate_layer_and_previous_map_tool(
         self, layer_to_activate: QgsMapLayer
     ) -> None:
@@ -106,72 +477,123 @@ class SetActiveLayerTool(QgsMapToolIdentify):
             return
         iface.mapCanvas().setMapTool(self.previous_map_tool)
 
+    def _identify_candidates(
+        self, location: QgsPointXY, search_radius: float, tiered: bool = False
+    ) -> List[IdentifyHit]:
+        """
+        Finds the features within search radius from the location.
+
+        Waits for the layers within the latency budget, layers that miss it
+        are skipped. Results are returned in the same top-down layer order as
+        identify would return them. If tiered, only the features of the
+        geometry type that would win are returned.
+        """
+        with TIMING_METRICS.measure(Stage.IDENTIFY):
+            if tiered:
+                search = self._create_tiered_search(location, search_radius)
+            else:
+                search = self._create_search(location, search_radius)
+            search.start()
+            search.wait()
+        return search.hits()
+
+    def _get_cached_features(
+        self, layer: QgsVectorLayer, layer_rect: QgsRectangle
+    ) -> Optional[List[QgsFeature]]:
+        """
+        Returns the features intersecting the rectangle from the spatial index cache.
+
+        Returns None if the index of the layer is not ready or the renderer
+        of the layer may hide features, as the cached features have no
+        attributes to decide that with.
+        """
+        if self.spatial_index_cache is None or renderer_filters_features(layer):
+            return None
+        return self.spatial_index_cache.features_in_rect(layer, layer_rect)
+
+    def _create_search(
+        self,
+        location: QgsPointXY,
+        search_radius: float,
+        layers: Optional[List[QgsVectorLayer]] = None,
+    ) -> LayerSearch:
+        """
+        Creates a search for the features within search radius from the location.
+
+        Only geometries are fetched. Layers that have a ready index in the
+        spatial index cache and no renderer filter are queried from the cache,
+        rest of the layers from the data providers concurrently. By default
+        all the identifiable layers are searched.
+        """
+        search_rect = get_search_rect(location, search_radius)
+        map_settings = self.canvas().mapSettings()
+        map_crs = map_settings.destinationCrs()
+
+        if layers is None:
+            layers = self._get_identifiable_vector_layers()
+        search = LayerSearch(Settings.query_latency_budget.get(typehint=int))
+        for layer in layers:
+            layer_rect = TRANSFORM_CACHE.transform_bounding_box(
+                search_rect, map_crs, layer.crs()
+            )
+            features = self._get_cached_features(layer, layer_rect)
+            if features is None:
+                search.add_query(LayerQuery(layer, layer_rect, map_settings))
+            else:
+                search.add_features(layer, features)
+        return search
+
+    def _create_tiered_search(
+        self, location: QgsPointXY, search_radius: float
+    ) -> TieredLayerSearch:
+        """
+        Creates a search that queries the layers by geometry type preference.
+
+        Any feature of a preferred geometry type wins regardless of the
+        distance, so the queries of the less preferred geometry types are
+        canceled as soon as a more preferred one has found features.
+        """
+        tiers: Dict[int, List[QgsVectorLayer]] = {}
+        for layer in self._get_identifiable_vector_layers():
+            tiers.setdefault(get_geometry_type_preference(layer), []).append(layer)
+        return TieredLayerSearch(
+            [
+                self._create_search(location, search_radius, tiers[rank])
+                for rank in sorted(tiers)
+            ],
+            Settings.query_latency_budget.get(typehint=int),
+        )
+
+    def _get_identifiable_vector_layers(self) -> List[QgsVectorLayer]:
+        return get_identifiable_vector_layers(self.canvas())
+
     def _get_default_search_radius(self) -> float:
-        # For some reason overriding searchRadiusMM does not seem to affect
-        # searchRadiusMU. Logic copied here from QgsMapTool.searchRadiusMU
-        context = QgsRenderContext.fromMapSettings(self.canvas().mapSettings())
-        return (
-            float(Settings.search_radius.get())
-            * context.scaleFactor()
-            * context.mapToPixel().mapUnitsPerPixel()
+        return search_radius_to_map_units(
+            float(Settings.search_radius.get()), self.canvas().mapSettings()
         )
 
-    def _get_distance_to_feature_on_layer(
+    def _rank_identify_results(
         self,
-        layer: QgsVectorLayer,
-        feature: QgsFeature,
-        origin_map_point: QgsPointXY,
-    ) -> float:
-        # for unknown reasons saving all geoms to variables avoids fatal exs
-        origin_layer_point = self.toLayerCoordinates(layer, origin_map_point)
-        origin_geom = QgsGeometry.fromPointXY(origin_layer_point)
-        feature_geom = feature.geometry()
-        closest_geom = feature_geom.nearestPoint(origin_geom)
-        closest_layer_point = closest_geom.asPoint()
-        closest_map_point = self.toMapCoordinates(layer, closest_layer_point)
-        return origin_map_point.distance(closest_map_point)
+        results: List[IdentifyHit],
+        origin_map_coordinates: QgsPointXY,
+    ) -> List[LayerCandidate]:
+        map_crs = self.canvas().mapSettings().destinationCrs()
+        with TIMING_METRICS.measure(Stage.SCORING):
+            return score_identify_results(
+                results, origin_map_coordinates, map_crs
+            ).candidates
 
     def _choose_layer_from_identify_results(
         self,
-        results: List[QgsMapToolIdentify.IdentifyResult],
+        results: List[IdentifyHit],
         origin_map_coordinates: QgsPointXY,
     ) -> Optional[QgsMapLayer]:
-
-        geom_type_preference = {
-            QgsWkbTypes.PointGeometry: 1,
-            QgsWkbTypes.LineGeometry: 2,
-            QgsWkbTypes.PolygonGeometry: 3,
-        }
-
-        best_match: Optional[QgsVectorLayer] = None
-        best_match_geom_type_preference = 0
-        best_match_distance = 0.0
-
-        for result in results:
-            if not isinstance(result.mLayer, QgsVectorLayer):
-                continue
-
-            if (
-                best_match is None
-                or geom_type_preference.get(result.mLayer.geometryType(), 99)
-                < best_match_geom_type_preference
-                or (
-                    geom_type_preference.get(result.mLayer.geometryType(), 99)
-                    == best_match_geom_type_preference
-                    and self._get_distance_to_feature_on_layer(
-                        result.mLayer, result.mFeature, origin_map_coordinates
-                    )
-                    < best_match_distance
-                )
-            ):
-                best_match = result.mLayer
-                best_match_geom_type_preference = geom_type_preference.get(
-                    result.mLayer.geometryType(), 99
-                )
-                best_match_distance = self._get_distance_to_feature_on_layer(
-                    result.mLayer,
-                    result.mFeature,
-                    origin_map_coordinates,
-                )
-
-        return best_match
+        map_crs = self.canvas().mapSettings().destinationCrs()
+        with TIMING_METRICS.measure(Stage.SCORING):
+            candidates = score_identify_results(
+                results, origin_map_coordinates, map_crs, best_only=True
+            ).candidates
+        if not candidates:
+            return None
+        layers_by_id = {result.mLayer.id(): result.mLayer for result in results}
+        return layers_by_id[candidates[0].layer_id]
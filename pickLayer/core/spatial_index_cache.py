@@ -0,0 +1,235 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+from typing import List, Optional, Set
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
+
+from pickLayer.core.layer_index import BackgroundLayerIndex, LayerIndexEntry
+from pickLayer.qgis_plugin_tools.tools.i18n import tr
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024  # bytes
+# Rough estimate of the R-tree node and bookkeeping cost of a single entry
+INDEX_ENTRY_OVERHEAD = 120  # bytes
+
+
+def _feature_size(geometry: QgsGeometry) -> int:
+    return geometry.wkbSize() + INDEX_ENTRY_OVERHEAD
+
+
+class _SizedIndex:
+    """Spatial index of a single layer with its estimated memory use"""
+
+    def __init__(self, index: QgsSpatialIndex, size: int) -> None:
+        self.index = index
+        self.size = size
+
+
+def _build_index(
+    task: QgsTask, source: QgsVectorLayerFeatureSource, feature_count: int
+) -> Optional[_SizedIndex]:
+    """Builds the index in a background thread from a feature source snapshot"""
+    index = QgsSpatialIndex(QgsSpatialIndex.FlagStoreFeatureGeometries)
+    size = 0
+    request = QgsFeatureRequest().setNoAttributes()
+    for i, feature in enumerate(source.getFeatures(request)):
+        if task.isCanceled():
+            return None
+        if not feature.hasGeometry():
+            continue
+        index.addFeature(feature)
+        size += _feature_size(feature.geometry())
+        if feature_count > 0 and i % 1000 == 0:
+            task.setProgress(100 * i / feature_count)
+    return _SizedIndex(index, size)
+
+
+class SpatialIndexCache(BackgroundLayerIndex[_SizedIndex]):
+    """
+    Plugin owned in-memory spatial index of vector layers.
+
+    Indexes are built lazily in the background the first time a layer is
+    queried and are kept up to date from the layer edit signals. Feature
+    geometries are stored in the index so candidate lookups do not need to
+    touch the data provider at all.
+
+    Total size of the indexes is kept under the memory budget by evicting
+    the least recently queried layers.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+        super().__init__()
+        self.memory_budget = memory_budget
+        # Layers that alone do not fit in the budget, not worth rebuilding
+        self._oversized: Set[str] = set()
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.data.size for entry in self._entries.values() if entry.data)
+
+    def is_ready(self, layer: QgsVectorLayer) -> bool:
+        entry = self._entries.get(layer.id())
+        return entry is not None and entry.data is not None
+
+    def features_in_rect(
+        self, layer: QgsVectorLayer, rect: QgsRectangle
+    ) -> Optional[List[QgsFeature]]:
+        """
+        Returns features of the layer intersecting with the rectangle.
+
+        The features have only the id and the geometry set.
+
+        Args:
+            layer: Layer to query
+            rect: Search rectangle in layer coordinates
+
+        Returns:
+            None if the index of the layer is not available yet. In that case
+            building of the index is started in the background.
+        """
+        entry = self._get_queried_entry(layer)
+        if entry is None:
+            return None
+
+        index = entry.data.index
+        rect_geometry = QgsGeometry.fromRect(rect)
+        features = []
+        for fid in index.intersects(rect):
+            geometry = index.geometry(fid)
+            if geometry.isNull() or not geometry.intersects(rect_geometry):
+                continue
+            feature = QgsFeature(fid)
+            feature.setGeometry(geometry)
+            features.append(feature)
+        return features
+
+    def ids_in_rect(
+        self, layer: QgsVectorLayer, rect: QgsRectangle
+    ) -> Optional[List[int]]:
+        """
+        Returns ids of the features whose bounding box intersects the rectangle.
+
+        Returns None if the index of the layer is not available yet.
+        """
+        entry = self._get_queried_entry(layer)
+        if entry is None:
+            return None
+        return entry.data.index.intersects(rect)
+
+    def clear(self) -> None:
+        """Removes all indexes and disconnects from the layers"""
+        super().clear()
+        self._oversized.clear()
+
+    def _get_queried_entry(
+        self, layer: QgsVectorLayer
+    ) -> Optional[LayerIndexEntry[_SizedIndex]]:
+        if layer.id() in self._oversized:
+            return None
+
+        entry = self._entries.get(layer.id())
+        if entry is None:
+            self._add_layer(layer)
+            return None
+        if entry.data is None:
+            return None
+
+        self._entries.move_to_end(layer.id())
+        return entry
+
+    def _build_data(
+        self, task: QgsTask, source: QgsVectorLayerFeatureSource, feature_count: int
+    ) -> Optional[_SizedIndex]:
+        return _build_index(task, source, feature_count)
+
+    def _task_description(self, layer: QgsVectorLayer) -> str:
+        return tr("Building spatial index for {}", layer.name())
+
+    def _build_error_message(self, exception: Exception) -> str:
+        return tr("Could not build spatial index for layer: {}", str(exception))
+
+    def _on_data_built(self, entry: LayerIndexEntry[_SizedIndex]) -> None:
+        layer_id = entry.layer.id()
+        if entry.data.size > self.memory_budget:
+            LOGGER.info(
+                tr(
+                    "Layer {} is too large for the spatial index cache",
+                    entry.layer.name(),
+                )
+            )
+            self._remove_layer(layer_id)
+            self._oversized.add(layer_id)
+            return
+
+        self._entries.move_to_end(layer_id)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Evicts least recently queried indexes until the cache fits the budget"""
+        total_size = self.total_size
+        for layer_id in list(self._entries.keys())[:-1]:
+            if total_size <= self.memory_budget:
+                break
+            entry = self._entries[layer_id]
+            if entry.data is None:
+                continue
+            LOGGER.debug(f"Evicting spatial index of layer {entry.layer.name()}")
+            total_size -= entry.data.size
+            self._remove_layer(layer_id)
+
+    def _remove_layers(self, layer_ids: List[str]) -> None:
+        super()._remove_layers(layer_ids)
+        self._oversized.difference_update(layer_ids)
+
+    def _add_feature(
+        self, entry: LayerIndexEntry[_SizedIndex], fid: int, geometry: QgsGeometry
+    ) -> None:
+        if geometry.isNull():
+            return
+        feature = QgsFeature(fid)
+        feature.setGeometry(geometry)
+        entry.data.index.addFeature(feature)
+        entry.data.size += _feature_size(geometry)
+
+    def _delete_feature(self, entry: LayerIndexEntry[_SizedIndex], fid: int) -> None:
+        geometry = entry.data.index.geometry(fid)
+        if geometry.isNull():
+            return
+        feature = QgsFeature(fid)
+        feature.setGeometry(geometry)
+        entry.data.index.deleteFeature(feature)
+        entry.data.size -= _feature_size(geometry)
+
+    def _change_geometry(
+        self, entry: LayerIndexEntry[_SizedIndex], fid: int, geometry: QgsGeometry
+    ) -> None:
+        self._delete_feature(entry, fid)
+        self._add_feature(entry, fid, geometry)
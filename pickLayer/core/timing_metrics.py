@@ -0,0 +1,166 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import enum
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from pickLayer.qgis_plugin_tools.tools.custom_logging import get_log_folder
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+# Latest samples kept per stage and provider for the percentiles
+WINDOW_SIZE = 1000
+# Upper bounds of the histogram buckets in milliseconds
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+ALL_PROVIDERS = "all"
+
+
+class Stage(enum.Enum):
+    CLICK = "click"  # from the click to the chosen layer or feature
+    IDENTIFY = "identify"  # search of all the layers under the click
+    LAYER_QUERY = "layer_query"  # query of a single layer
+    SCORING = "scoring"
+    TRANSFORM = "transform"
+    HIGHLIGHT = "highlight"
+    MENU = "menu"  # context menu build
+    SPATIAL_OPERATION = "spatial_operation"
+
+
+def elapsed_ms(started_at: float) -> float:
+    """Returns milliseconds since the given time.perf_counter() value"""
+    return (time.perf_counter() - started_at) * 1000
+
+
+def _percentile(sorted_samples: List[float], percent: float) -> float:
+    """Nearest-rank percentile of the sorted samples"""
+    rank = max(math.ceil(percent / 100 * len(sorted_samples)), 1)
+    return sorted_samples[rank - 1]
+
+
+class _StageTimings:
+    """Rolling samples and total count of a single stage and provider"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.samples: Deque[float] = deque(maxlen=WINDOW_SIZE)
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.samples.append(duration)
+
+    def summary(self) -> Dict[str, Any]:
+        sorted_samples = sorted(self.samples)
+        histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        bucket_index = 0
+        for duration in sorted_samples:
+            while (
+                bucket_index < len(HISTOGRAM_BUCKETS)
+                and duration > HISTOGRAM_BUCKETS[bucket_index]
+            ):
+                bucket_index += 1
+            histogram[bucket_index] += 1
+        return {
+            "count": self.count,
+            "p50_ms": _percentile(sorted_samples, 50),
+            "p95_ms": _percentile(sorted_samples, 95),
+            "p99_ms": _percentile(sorted_samples, 99),
+            "max_ms": sorted_samples[-1],
+            "histogram": {
+                **{
+                    f"<={bound}ms": count
+                    for bound, count in zip(HISTOGRAM_BUCKETS, histogram)
+                },
+                f">{HISTOGRAM_BUCKETS[-1]}ms": histogram[-1],
+            },
+        }
+
+
+class TimingMetrics:
+    """
+    Rolling latency statistics of the plugin operations.
+
+    Durations are kept per stage and per layer data provider. Percentiles
+    and histograms are computed from the latest samples, counts include
+    every recorded operation. Layer queries record from worker threads.
+    """
+
+    def __init__(self) -> None:
+        self._timings: Dict[Tuple[Stage, str], _StageTimings] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: Stage, duration: float, provider: str = "") -> None:
+        """Records a duration in milliseconds"""
+        with self._lock:
+            keys = [(stage, ALL_PROVIDERS)]
+            if provider:
+                keys.append((stage, provider))
+            for key in keys:
+                timings = self._timings.get(key)
+                if timings is None:
+                    timings = self._timings[key] = _StageTimings()
+                timings.add(duration)
+
+    @contextmanager
+    def measure(self, stage: Stage, provider: str = "") -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, elapsed_ms(started_at), provider)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Returns the statistics by stage and provider.
+
+        Statistics of all the providers together are under the "all" key.
+        """
+        with self._lock:
+            items = [(key, timings.summary()) for key, timings in self._timings.items()]
+        summary: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (stage, provider), stage_summary in sorted(
+            items, key=lambda item: (item[0][0].value, item[0][1])
+        ):
+            summary.setdefault(stage.value, {})[provider] = stage_summary
+        return summary
+
+    def export_json(self, path: Optional[Path] = None) -> Path:
+        """Writes the summary as JSON, by default to the log folder"""
+        if path is None:
+            path = get_log_folder() / (
+                f"{plugin_name()}_timings_{datetime.now():%Y%m%d_%H%M%S}.json"
+            )
+        path.write_text(json.dumps(self.summary(), indent=2), encoding="utf-8")
+        LOGGER.info(f"Timing metrics exported to {path}")
+        return path
+
+    def clear(self) -> None:
+        with self._lock:
+            self._timings.clear()
+
+
+TIMING_METRICS = TimingMetrics()
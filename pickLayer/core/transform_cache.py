@@ -0,0 +1,143 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle,
+)
+from qgis.utils import iface
+
+from pickLayer.qgis_plugin_tools.tools.i18n import tr
+from pickLayer.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+
+def _crs_key(crs: QgsCoordinateReferenceSystem) -> str:
+    return crs.authid() or crs.toWkt()
+
+
+class TransformCache:
+    """
+    Cache of coordinate transforms shared by the map tools.
+
+    Transforms are created with the transform context of the project, so the
+    cache is cleared whenever the project transform context or the map canvas
+    destination crs changes. Like QgsMapSettings, coordinates that can not be
+    transformed are returned as is.
+    """
+
+    def __init__(self) -> None:
+        self._transforms: Dict[Tuple[str, str], QgsCoordinateTransform] = {}
+        self._connected = False
+
+    def get(
+        self,
+        source_crs: QgsCoordinateReferenceSystem,
+        destination_crs: QgsCoordinateReferenceSystem,
+    ) -> QgsCoordinateTransform:
+        self._connect()
+        key = (_crs_key(source_crs), _crs_key(destination_crs))
+        transform = self._transforms.get(key)
+        if transform is None:
+            transform = QgsCoordinateTransform(
+                source_crs, destination_crs, QgsProject.instance().transformContext()
+            )
+            self._transforms[key] = transform
+        return transform
+
+    def transform_points(
+        self,
+        points: Sequence[QgsPointXY],
+        source_crs: QgsCoordinateReferenceSystem,
+        destination_crs: QgsCoordinateReferenceSystem,
+    ) -> List[QgsPointXY]:
+        """Transforms all the points with a single transform call if possible"""
+        transform = self.get(source_crs, destination_crs)
+        if transform.isShortCircuited() or not points:
+            return [QgsPointXY(point) for point in points]
+        geometry = QgsGeometry.fromMultiPointXY(list(points))
+        try:
+            geometry.transform(transform)
+        except QgsCsException:
+            # Transform one by one to keep the points that can be transformed
+            return [
+                self.transform_point(point, source_crs, destination_crs)
+                for point in points
+            ]
+        return geometry.asMultiPoint()
+
+    def transform_point(
+        self,
+        point: QgsPointXY,
+        source_crs: QgsCoordinateReferenceSystem,
+        destination_crs: QgsCoordinateReferenceSystem,
+    ) -> QgsPointXY:
+        try:
+            return self.get(source_crs, destination_crs).transform(point)
+        except QgsCsException as e:
+            _log_transform_error(e)
+            return QgsPointXY(point)
+
+    def transform_bounding_box(
+        self,
+        rect: QgsRectangle,
+        source_crs: QgsCoordinateReferenceSystem,
+        destination_crs: QgsCoordinateReferenceSystem,
+    ) -> QgsRectangle:
+        transform = self.get(source_crs, destination_crs)
+        if transform.isShortCircuited():
+            return QgsRectangle(rect)
+        try:
+            return transform.transformBoundingBox(rect)
+        except QgsCsException as e:
+            _log_transform_error(e)
+            return QgsRectangle(rect)
+
+    def clear(self) -> None:
+        self._transforms.clear()
+
+    def _connect(self) -> None:
+        if self._connected:
+            return
+        QgsProject.instance().transformContextChanged.connect(self.clear)
+        iface.mapCanvas().destinationCrsChanged.connect(self.clear)
+        self._connected = True
+
+    def disconnect(self) -> None:
+        if not self._connected:
+            return
+        QgsProject.instance().transformContextChanged.disconnect(self.clear)
+        iface.mapCanvas().destinationCrsChanged.disconnect(self.clear)
+        self._connected = False
+        self.clear()
+
+
+def _log_transform_error(exception: QgsCsException) -> None:
+    LOGGER.warning(tr("Could not transform coordinates: {}", str(exception)))
+
+
+TRANSFORM_CACHE = TransformCache()
@@ -19,18 +19,43 @@
 #  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
 
 import enum
-from typing import Any, Union
+from typing import Any, Callable, Dict, Tuple, Union
+
+from qgis.PyQt.QtCore import QObject, QTimer, pyqtSignal
 
 from pickLayer.qgis_plugin_tools.tools.settings import get_setting, set_setting
 
+SAVE_DELAY = 500  # ms
+
 
 class Settings(enum.Enum):
     identify_tool_search_radius = "Map/searchRadiusMM"  # QGIS setting key
     # No default value, if this is not set, use the same value as identify tool
     search_radius = -1.0
+    # Milliseconds to wait for a layer to answer a click
+    query_latency_budget = 1000
+    # Show the layer to activate under the cursor of the set active layer tool
+    hover_preview = False
 
     def get(self, typehint: type = str) -> Any:
-        """Gets the value of the setting"""
+        """Gets the value of the setting, from memory if it has been read"""
+        return SETTINGS_CACHE.get(self, typehint, lambda: self._read(typehint))
+
+    def set(self, value: Union[str, int, float, bool]) -> bool:
+        """Sets the value of the setting"""
+        SETTINGS_CACHE.discard_pending(self)
+        if self == Settings.identify_tool_search_radius:
+            success = set_setting(self.value, value, internal=False)
+        else:
+            success = set_setting(self.name, value)
+        SETTINGS_CACHE.invalidate()
+        return success
+
+    def set_later(self, value: Union[str, int, float, bool]) -> None:
+        """Sets the value of the setting in memory and saves it after a delay"""
+        SETTINGS_CACHE.set_later(self, value)
+
+    def _read(self, typehint: type) -> Any:
         if self == Settings.identify_tool_search_radius:
             value = get_setting(self.value, internal=False)
         elif self == Settings.search_radius:
@@ -48,8 +73,55 @@ class Settings(enum.Enum):
             value = get_setting(self.name, self.value, typehint)
         return value
 
-    def set(self, value: Union[str, int, float, bool]) -> bool:
-        """Sets the value of the setting"""
-        if self == Settings.identify_tool_search_radius:
-            return set_setting(self.value, value, internal=False)
-        return set_setting(self.name, value)
+
+class SettingsCache(QObject):
+    """
+    Process-wide in-memory cache of the plugin settings.
+
+    Cached values are dropped whenever changed is emitted. Values set with
+    set_later are served from memory until they are saved.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._values: Dict[Tuple[str, type], Any] = {}
+        self._pending_values: Dict[Settings, Any] = {}
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(SAVE_DELAY)
+        self._save_timer.timeout.connect(self.flush)
+        self.changed.connect(self._clear)
+
+    def get(self, setting: Settings, typehint: type, read: Callable[[], Any]) -> Any:
+        if setting in self._pending_values:
+            return self._pending_values[setting]
+        key = (setting.name, typehint)
+        if key not in self._values:
+            self._values[key] = read()
+        return self._values[key]
+
+    def set_later(self, setting: Settings, value: Any) -> None:
+        self._pending_values[setting] = value
+        self._save_timer.start()
+        self.changed.emit()
+
+    def discard_pending(self, setting: Settings) -> None:
+        self._pending_values.pop(setting, None)
+
+    def flush(self) -> None:
+        """Saves the values set with set_later"""
+        self._save_timer.stop()
+        pending_values, self._pending_values = self._pending_values, {}
+        for setting, value in pending_values.items():
+            setting.set(value)
+
+    def invalidate(self) -> None:
+        self.changed.emit()
+
+    def _clear(self) -> None:
+        self._values.clear()
+
+
+SETTINGS_CACHE = SettingsCache()
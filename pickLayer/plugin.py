@@ -18,7 +18,17 @@
 #  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
 
 import logging
-from typing import Callable, List, Optional
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+)
 
 from qgis.core import QgsApplication, QgsPointXY
 from qgis.gui import QgsGui, QgsMapTool
@@ -27,15 +37,23 @@ from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QToolBar, QToolButton, QWidget
 from qgis.utils import iface
 
-from pickLayer.core.picklayer import PickLayer
-from pickLayer.core.set_active_layer_tool import SetActiveLayerTool
+from pickLayer.core.feature_query import shutdown_query_pool
+from pickLayer.core.geometry_validity_index import GeometryValidityIndex
+from pickLayer.core.layer_candidates import ClosestFeature, LayerCandidate
+from pickLayer.core.spatial_index_cache import SpatialIndexCache
+from pickLayer.core.timing_metrics import TIMING_METRICS
+from pickLayer.core.transform_cache import TRANSFORM_CACHE
+from pickLayer.definitions.settings import SETTINGS_CACHE
 from pickLayer.qgis_plugin_tools.tools.custom_logging import (
     setup_logger,
     teardown_logger,
 )
 from pickLayer.qgis_plugin_tools.tools.i18n import setup_translation, tr
 from pickLayer.qgis_plugin_tools.tools.resources import plugin_name, resources_path
-from pickLayer.ui.settings_dialog import SettingsDialog
+
+if TYPE_CHECKING:
+    from pickLayer.core.picklayer import PickLayer
+    from pickLayer.core.set_active_layer_tool import SetActiveLayerTool
 
 LOGGER = logging.getLogger(plugin_name())
 
@@ -59,11 +77,26 @@ class Plugin:
         self.actions: List[QAction] = []
         self.toolbar: Optional[QToolBar] = None
         self.menu = plugin_name()
-        self.pick_layer_tool: Optional[PickLayer] = None
+        self.pick_layer_tool: Optional["PickLayer"] = None
         self.pick_layer_action: Optional[QAction] = None
-        self.set_active_layer_tool = SetActiveLayerTool(iface.mapCanvas())
+        self.spatial_index_cache = SpatialIndexCache()
+        self.geometry_validity_index = GeometryValidityIndex()
+        self._set_active_layer_tool: Optional["SetActiveLayerTool"] = None
         self.set_active_layer_action: Optional[QAction] = None
 
+    @property
+    def set_active_layer_tool(self) -> "SetActiveLayerTool":
+        """Set active layer tool, created on first use to keep startup fast"""
+        if self._set_active_layer_tool is None:
+            from pickLayer.core.set_active_layer_tool import SetActiveLayerTool
+
+            self._set_active_layer_tool = SetActiveLayerTool(
+                iface.mapCanvas(), self.spatial_index_cache
+            )
+            if self.set_active_layer_action is not None:
+                self._set_active_layer_tool.setAction(self.set_active_layer_action)
+        return self._set_active_layer_tool
+
     def get_set_active_layer_tool_action(self) -> QAction:
         """
         Public method for getting action that sets active layer.
@@ -92,6 +125,64 @@ class Plugin:
             point_xy, search_radius
         )
 
+    def find_layer_candidates(
+        self, point_xy: QgsPointXY, search_radius: Optional[float] = None
+    ) -> List[LayerCandidate]:
+        """
+        Public method for finding what is under the given map coordinates.
+
+        Returns all the features within search radius as a ranked list using
+        the same order as set_active_layer_using_closest_feature. Does not
+        change the active layer.
+
+        Args:
+            point_xy: Map coordinates
+            search_radius: Search radius to use in map units. By default uses
+              search radius defined in PickLayer settings.
+        """
+        return self.set_active_layer_tool.find_candidates(point_xy, search_radius)
+
+    def find_closest_features(
+        self,
+        points: Iterable[Sequence[float]],
+        search_radius: Optional[float] = None,
+    ) -> List[Optional[ClosestFeature]]:
+        """
+        Public method for finding closest features for many map coordinates.
+
+        Uses the same layer order as set_active_layer_using_closest_feature but
+        does not change the active layer or the map tool.
+
+        Args:
+            points: Map coordinates as QgsPointXY's, (x, y) pairs or a NumPy
+              array of shape (N, 2)
+            search_radius: Search radius to use in map units. By default uses
+              search radius defined in PickLayer settings.
+
+        Returns:
+            Layer, feature id and distance of the closest feature for each of
+            the points, None if no feature was found.
+        """
+        return self.set_active_layer_tool.find_closest_features(points, search_radius)
+
+    def get_timing_metrics(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Public method for getting latency statistics of the plugin operations.
+
+        Returns count, p50, p95 and p99 latencies and a histogram in
+        milliseconds by stage, such as "identify", "scoring" or "menu", and by
+        layer data provider. Statistics of all providers are under "all".
+        """
+        return TIMING_METRICS.summary()
+
+    def export_timing_metrics(self) -> Path:
+        """
+        Public method for exporting the latency statistics as JSON.
+
+        The file is written to the plugin log folder and its path is returned.
+        """
+        return TIMING_METRICS.export_json()
+
     def initGui(self) -> None:  # noqa N802
         """Create the menu entries and toolbar icons inside the QGIS GUI."""
 
@@ -127,7 +218,12 @@ class Plugin:
             add_keyboard_shortcut=True,
         )
 
-        self.set_active_layer_tool.setAction(self.set_active_layer_action)
+        if self._set_active_layer_tool is not None:
+            self._set_active_layer_tool.setAction(self.set_active_layer_action)
+
+        # QGIS options may change the identify search radius
+        if hasattr(iface, "optionsChanged"):
+            iface.optionsChanged.connect(SETTINGS_CACHE.invalidate)
 
     def onClosePlugin(self) -> None:  # noqa N802
         """Cleanup necessary items here when plugin dockwidget is closed"""
@@ -140,6 +236,22 @@ class Plugin:
             iface.removeToolBarIcon(action)
             iface.unregisterMainWindowAction(action)
 
+        if self.pick_layer_tool is not None:
+            self.pick_layer_tool.unload()
+            self.pick_layer_tool = None
+        if self._set_active_layer_tool is not None:
+            self._set_active_layer_tool.unload()
+            self._set_active_layer_tool.deleteLater()
+            self._set_active_layer_tool = None
+
+        if hasattr(iface, "optionsChanged"):
+            iface.optionsChanged.disconnect(SETTINGS_CACHE.invalidate)
+        self.spatial_index_cache.disconnect()
+        self.geometry_validity_index.disconnect()
+        TRANSFORM_CACHE.disconnect()
+        shutdown_query_pool()
+        SETTINGS_CACHE.flush()
+
         teardown_logger(plugin_name())
 
         # Remove toolbar from QGIS by deleting it
@@ -224,12 +336,20 @@ class Plugin:
 
     def _activate_pick_layer(self) -> None:
         """Activates pick layer tool"""
-        self.pick_layer_tool = PickLayer()
-        self.pick_layer_tool.map_tool.setAction(self.pick_layer_action)
+        # In case the options changed signal is not available
+        SETTINGS_CACHE.invalidate()
+        if self.pick_layer_tool is None:
+            from pickLayer.core.picklayer import PickLayer
+
+            self.pick_layer_tool = PickLayer(
+                self.spatial_index_cache, self.geometry_validity_index
+            )
+            self.pick_layer_tool.map_tool.setAction(self.pick_layer_action)
         self.pick_layer_tool.set_map_tool()
 
     def _set_active_layer_tool_selected(self) -> None:
         """Activates set active layer tool"""
+        SETTINGS_CACHE.invalidate()
         if iface.mapCanvas().mapTool() is not None:
             current_map_tool: QgsMapTool = iface.mapCanvas().mapTool()
             LOGGER.debug(
@@ -242,6 +362,9 @@ class Plugin:
         iface.mapCanvas().setMapTool(self.set_active_layer_tool)
 
     def _open_settings_dialg(self) -> None:
+        # The dialog ui file is parsed on import
+        from pickLayer.ui.settings_dialog import SettingsDialog
+
         dlg = SettingsDialog(iface.mainWindow())
         dlg.open()
 
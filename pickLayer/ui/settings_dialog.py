@@ -23,7 +23,7 @@ from typing import Optional
 from qgis.core import QgsApplication
 from qgis.PyQt.QtWidgets import QDialog, QWidget
 
-from pickLayer.definitions.settings import Settings
+from pickLayer.definitions.settings import SETTINGS_CACHE, Settings
 from pickLayer.qgis_plugin_tools.tools.custom_logging import (
     LogTarget,
     get_log_folder,
@@ -51,14 +51,29 @@ class SettingsDialog(QDialog, FORM_CLASS):
         self.setupUi(self)
         self.setWindowIcon(QgsApplication.getThemeIcon("/propertyicons/settings.svg"))
         self._setup_settings()
+        self.finished.connect(lambda _: SETTINGS_CACHE.flush())
 
     def _setup_settings(self) -> None:
         # Search radius
         self.spin_box_search_radius.setValue(Settings.search_radius.get())
         self.spin_box_search_radius.valueChanged.connect(
-            lambda v: Settings.search_radius.set(float(v))
+            lambda v: Settings.search_radius.set_later(float(v))
         )
 
+        # Latency budget
+        self.spin_box_latency_budget.setValue(
+            Settings.query_latency_budget.get(typehint=int)
+        )
+        self.spin_box_latency_budget.valueChanged.connect(
+            lambda v: Settings.query_latency_budget.set_later(int(v))
+        )
+
+        # Hover preview
+        self.check_box_hover_preview.setChecked(
+            Settings.hover_preview.get(typehint=bool)
+        )
+        self.check_box_hover_preview.toggled.connect(Settings.hover_preview.set_later)
+
         # Logging
         self.combo_box_log_level_file.addItems(LOGGING_LEVELS)
         self.combo_box_log_level_console.addItems(LOGGING_LEVELS)
@@ -0,0 +1,297 @@
+#  Copyright (C) 2021-2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+
+# type: ignore
+# flake8: noqa ANN201
+"""
+Benchmarks of the picking and set active layer hot paths.
+
+By default only a small smoke scenario is run. Set PICKLAYER_BENCHMARK_SCALE
+to "full" for the real workloads and PICKLAYER_BENCHMARK_OUTPUT to the folder
+where the JSON results are written. Run with QT_QPA_PLATFORM=offscreen.
+"""
+
+import configparser
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import pytest
+from qgis.core import (
+    Qgis,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+import pickLayer
+
+MAP_CRS = "EPSG:3067"
+LAYER_CRSS = ["EPSG:3067", "EPSG:4326", "EPSG:3857"]
+GEOMETRY_TYPES = [QgsWkbTypes.Point, QgsWkbTypes.LineString, QgsWkbTypes.Polygon]
+DATA_EXTENT = QgsRectangle(300000, 6700000, 400000, 6800000)
+CANVAS_EXTENT_SIZE = 2000  # map units around the data center
+FEATURE_SIZE = 10  # map units
+WRITE_CHUNK_SIZE = 10000
+REPEAT = 20
+
+
+class Scenario(NamedTuple):
+    feature_count: int  # per layer
+    layer_count: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.feature_count}x{self.layer_count}"
+
+
+SCENARIOS = {
+    "smoke": [Scenario(1000, 3)],
+    "full": [
+        Scenario(10000, 1),
+        Scenario(100000, 10),
+        Scenario(1000000, 1),
+        Scenario(10000, 100),
+    ],
+}
+
+
+def get_scenarios() -> List[Scenario]:
+    return SCENARIOS[os.environ.get("PICKLAYER_BENCHMARK_SCALE", "smoke")]
+
+
+def _create_geometry(
+    geometry_type: QgsWkbTypes.Type, x: float, y: float
+) -> QgsGeometry:
+    if geometry_type == QgsWkbTypes.Point:
+        return QgsGeometry.fromPointXY(QgsPointXY(x, y))
+    if geometry_type == QgsWkbTypes.LineString:
+        return QgsGeometry.fromPolylineXY(
+            [QgsPointXY(x, y), QgsPointXY(x + FEATURE_SIZE, y + FEATURE_SIZE)]
+        )
+    return QgsGeometry.fromRect(QgsRectangle(x, y, x + FEATURE_SIZE, y + FEATURE_SIZE))
+
+
+def _write_layer(
+    path: Path, index: int, feature_count: int, rng: random.Random
+) -> None:
+    geometry_type = GEOMETRY_TYPES[index % len(GEOMETRY_TYPES)]
+    crs = QgsCoordinateReferenceSystem(LAYER_CRSS[index % len(LAYER_CRSS)])
+    transform = QgsCoordinateTransform(
+        QgsCoordinateReferenceSystem(MAP_CRS), crs, QgsProject.instance()
+    )
+    fields = QgsFields()
+    fields.append(QgsField("name", QVariant.String))
+
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    writer = QgsVectorFileWriter.create(
+        str(path),
+        fields,
+        geometry_type,
+        crs,
+        QgsCoordinateTransformContext(),
+        options,
+    )
+    assert writer.hasError() == QgsVectorFileWriter.NoError, writer.errorMessage()
+
+    features = []
+    for i in range(feature_count):
+        geometry = _create_geometry(
+            geometry_type,
+            rng.uniform(DATA_EXTENT.xMinimum(), DATA_EXTENT.xMaximum()),
+            rng.uniform(DATA_EXTENT.yMinimum(), DATA_EXTENT.yMaximum()),
+        )
+        geometry.transform(transform)
+        feature = QgsFeature(fields)
+        feature.setGeometry(geometry)
+        feature.setAttribute("name", f"feature {i}")
+        features.append(feature)
+        if len(features) == WRITE_CHUNK_SIZE:
+            writer.addFeatures(features)
+            features = []
+    writer.addFeatures(features)
+    del writer  # flushes the file
+
+
+@pytest.fixture(scope="session")
+def benchmark_data(tmp_path_factory) -> Callable[[Scenario], List[Path]]:
+    """Generates the GeoPackages of a scenario once per session"""
+    generated: Dict[Scenario, List[Path]] = {}
+
+    def get_paths(scenario: Scenario) -> List[Path]:
+        if scenario not in generated:
+            folder = tmp_path_factory.mktemp(scenario.name)
+            rng = random.Random(scenario.feature_count)
+            paths = []
+            for index in range(scenario.layer_count):
+                path = folder / f"layer_{index}.gpkg"
+                _write_layer(path, index, scenario.feature_count, rng)
+                paths.append(path)
+            generated[scenario] = paths
+        return generated[scenario]
+
+    return get_paths
+
+
+@pytest.fixture(params=get_scenarios(), ids=lambda scenario: scenario.name)
+def scenario(request) -> Scenario:
+    return request.param
+
+
+@pytest.fixture(params=["memory", "ogr"])
+def provider(request) -> str:
+    return request.param
+
+
+@pytest.fixture()
+def benchmark_canvas(qgis_iface, qgis_new_project, benchmark_data, scenario, provider):
+    """Canvas showing the scenario layers from the given provider"""
+    layers = []
+    for index, path in enumerate(benchmark_data(scenario)):
+        layer = QgsVectorLayer(str(path), f"layer {index}", "ogr")
+        assert layer.isValid()
+        if provider == "memory":
+            layer = layer.materialize(QgsFeatureRequest())
+            layer.setName(f"layer {index}")
+        layers.append(layer)
+    QgsProject.instance().addMapLayers(layers)
+
+    canvas = qgis_iface.mapCanvas()
+    canvas.setDestinationCrs(QgsCoordinateReferenceSystem(MAP_CRS))
+    canvas.setLayers(layers)
+    center = DATA_EXTENT.center()
+    canvas.setExtent(
+        QgsRectangle(
+            center.x() - CANVAS_EXTENT_SIZE / 2,
+            center.y() - CANVAS_EXTENT_SIZE / 2,
+            center.x() + CANVAS_EXTENT_SIZE / 2,
+            center.y() + CANVAS_EXTENT_SIZE / 2,
+        )
+    )
+    # Rendering would compete with the measured code
+    canvas.freeze(True)
+    yield canvas
+    canvas.freeze(False)
+
+
+@pytest.fixture()
+def click_locations(benchmark_canvas) -> List[QgsPointXY]:
+    rng = random.Random(0)
+    extent = benchmark_canvas.extent()
+    return [
+        QgsPointXY(
+            rng.uniform(extent.xMinimum(), extent.xMaximum()),
+            rng.uniform(extent.yMinimum(), extent.yMaximum()),
+        )
+        for _ in range(REPEAT)
+    ]
+
+
+def _get_plugin_version() -> str:
+    metadata = configparser.ConfigParser()
+    metadata.read(Path(pickLayer.__file__).parent / "metadata.txt", encoding="utf-8")
+    return metadata.get("general", "version", fallback="unknown")
+
+
+@pytest.fixture(scope="session")
+def benchmark_results() -> List[Dict[str, Any]]:
+    """Collects the benchmark timings and writes them as JSON at the end"""
+    results: List[Dict[str, Any]] = []
+    yield results
+
+    output_folder = os.environ.get("PICKLAYER_BENCHMARK_OUTPUT")
+    if not output_folder or not results:
+        return
+    started_at = datetime.now()
+    output_path = Path(output_folder) / (
+        f"benchmark_{_get_plugin_version()}_{started_at:%Y%m%d_%H%M%S}.json"
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(
+        json.dumps(
+            {
+                "plugin_version": _get_plugin_version(),
+                "qgis_version": Qgis.QGIS_VERSION,
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "created": started_at.isoformat(timespec="seconds"),
+                "results": results,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+
+
+@pytest.fixture()
+def benchmark(benchmark_results, request) -> Callable:
+    """
+    Times the given function once per argument after a warm-up call.
+
+    Timings are stored in milliseconds with the scenario and provider of the
+    test if it has them.
+    """
+
+    def run(function: Callable[[Any], Any], arguments: List[Any]) -> List[float]:
+        function(arguments[0])
+        timings = []
+        for argument in arguments:
+            started_at = time.perf_counter()
+            function(argument)
+            timings.append((time.perf_counter() - started_at) * 1000)
+
+        result = {"name": request.node.originalname}
+        scenario = request.node.funcargs.get("scenario")
+        if scenario is not None:
+            result["feature_count"] = scenario.feature_count
+            result["layer_count"] = scenario.layer_count
+        if "provider" in request.node.funcargs:
+            result["provider"] = request.node.funcargs["provider"]
+        result.update(
+            {
+                "repeat": len(timings),
+                "min_ms": min(timings),
+                "median_ms": statistics.median(timings),
+                "mean_ms": statistics.mean(timings),
+                "max_ms": max(timings),
+            }
+        )
+        benchmark_results.append(result)
+        return timings
+
+    return run
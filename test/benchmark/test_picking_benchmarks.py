@@ -0,0 +1,143 @@
+#  Copyright (C) 2021-2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from qgis.core import QgsProject
+from qgis.gui import QgsRubberBand
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtWidgets import QMenu
+
+from pickLayer.core.feature_highlighter import FLASH_INTERVAL
+from pickLayer.core.identifygeometry import IdentifyGeometry
+from pickLayer.core.picklayer import PickLayer
+from pickLayer.core.set_active_layer_tool import SetActiveLayerTool
+
+SEARCH_TIMEOUT = 30  # s
+
+
+@pytest.fixture()
+def set_active_layer_tool(benchmark_canvas):
+    return SetActiveLayerTool(benchmark_canvas)
+
+
+def test_set_active_layer_using_closest_feature(
+    set_active_layer_tool, click_locations, benchmark
+):
+    benchmark(
+        set_active_layer_tool.set_active_layer_using_closest_feature, click_locations
+    )
+
+
+def test_choose_layer_from_identify_results(
+    set_active_layer_tool, click_locations, benchmark
+):
+    search_radius = set_active_layer_tool._get_default_search_radius()
+    results_per_location = [
+        (set_active_layer_tool._identify_candidates(location, search_radius), location)
+        for location in click_locations
+    ]
+
+    benchmark(
+        lambda args: set_active_layer_tool._choose_layer_from_identify_results(*args),
+        results_per_location,
+    )
+
+
+def test_identify_geometry_canvas_release_event(
+    benchmark_canvas, click_locations, benchmark, mocker
+):
+    mocker.patch.object(
+        IdentifyGeometry, "_choose_hit", side_effect=lambda hits, point: hits[0]
+    )
+    map_tool = IdentifyGeometry(benchmark_canvas)
+    transform = benchmark_canvas.getCoordinateTransform()
+
+    def click(location) -> None:
+        pixel = transform.transform(location)
+        map_tool.canvasReleaseEvent(
+            MagicMock(**{"pos.return_value": pixel.toQPointF().toPoint()})
+        )
+        deadline = time.perf_counter() + SEARCH_TIMEOUT
+        while map_tool.pending_search is not None:
+            assert time.perf_counter() < deadline
+            QCoreApplication.processEvents()
+
+    benchmark(click, click_locations)
+
+
+def test_context_menu_request(benchmark_canvas, benchmark, mocker):
+    mocker.patch.object(QMenu, "exec_")
+    pick_layer = PickLayer()
+    layers = list(QgsProject.instance().mapLayers().values())
+    selections = [
+        (layer, next(layer.getFeatures())) for layer in layers for _ in range(5)
+    ]
+
+    def open_menu(selection) -> None:
+        pick_layer.selected_layer, pick_layer.selected_feature = selection
+        pick_layer.context_menu_request()
+
+    try:
+        benchmark(open_menu, selections)
+    finally:
+        pick_layer.unload()
+
+
+def _flash_blocking(canvas, geometry, layer) -> None:
+    """Highlight as it was before the timer driven flash, kept for comparison"""
+    rubber_band = QgsRubberBand(canvas, geometry.type())
+    rubber_band.setToGeometry(geometry, layer)
+    for step in [rubber_band.hide, rubber_band.show, rubber_band.reset]:
+        QCoreApplication.processEvents()
+        time.sleep(FLASH_INTERVAL / 1000)
+        step()
+    QCoreApplication.processEvents()
+    canvas.scene().removeItem(rubber_band)
+
+
+def _benchmark_time_to_menu(benchmark, mocker, pick_layer) -> None:
+    """Times a feature pick from the highlight until the context menu opens"""
+    mocker.patch.object(QMenu, "exec_")
+    layers = list(QgsProject.instance().mapLayers().values())
+    selections = [
+        (layer, next(layer.getFeatures())) for layer in layers for _ in range(5)
+    ]
+
+    try:
+        benchmark(lambda selection: pick_layer.edit_feature(*selection), selections)
+    finally:
+        pick_layer.unload()
+
+
+def test_time_to_menu(benchmark_canvas, benchmark, mocker):
+    _benchmark_time_to_menu(benchmark, mocker, PickLayer())
+
+
+def test_time_to_menu_with_blocking_highlight(benchmark_canvas, benchmark, mocker):
+    pick_layer = PickLayer()
+    mocker.patch.object(
+        pick_layer.highlighter,
+        "flash",
+        side_effect=lambda geometry, layer: _flash_blocking(
+            benchmark_canvas, geometry, layer
+        ),
+    )
+    _benchmark_time_to_menu(benchmark, mocker, pick_layer)
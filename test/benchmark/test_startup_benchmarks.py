@@ -0,0 +1,36 @@
+#  Copyright (C) 2021-2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+from pickLayer import classFactory
+
+REPEAT = 20
+
+
+def test_class_factory_and_init_gui(mock_iface, qgis_iface, benchmark):
+    plugins = []
+
+    def start_plugin(_) -> None:
+        plugin = classFactory(qgis_iface)
+        plugin.initGui()
+        plugins.append(plugin)
+
+    try:
+        benchmark(start_plugin, list(range(REPEAT)))
+    finally:
+        for plugin in plugins:
+            plugin.unload()
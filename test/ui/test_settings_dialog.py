@@ -49,6 +49,16 @@ def test_set_search_radius(settings_dialog, qtbot):
     assert Settings.search_radius.get() == 21.5
 
 
+def test_search_radius_is_saved_once_after_typing(settings_dialog, qtbot, mocker):
+    m_set_setting = mocker.patch("pickLayer.definitions.settings.set_setting")
+
+    qtbot.keyClicks(settings_dialog.spin_box_search_radius, "21.5")
+    m_set_setting.assert_not_called()
+    settings_dialog.accept()
+
+    m_set_setting.assert_called_once_with(Settings.search_radius.name, 21.5)
+
+
 def test_set_file_log_level(settings_dialog, qtbot):
     qtbot.mouseMove(settings_dialog.combo_box_log_level_file)
     qtbot.keyClicks(settings_dialog.combo_box_log_level_file, "D")
@@ -0,0 +1,102 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+from typing import Any, Callable, Optional
+
+import pytest
+from qgis.core import QgsGeometry, QgsVectorLayer, QgsVectorLayerUtils
+
+from pickLayer.core.batch_edit import ChunkedEditJob
+
+
+@pytest.fixture()
+def point_layer(qgis_iface):
+    layer = QgsVectorLayer("Point?crs=EPSG:3067", "points", "memory")
+    features = [
+        QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(f"POINT({i} 0)"))
+        for i in range(25)
+    ]
+    success, _ = layer.dataProvider().addFeatures(features)
+    assert success
+    layer.startEditing()
+    yield layer
+    layer.rollBack()
+
+
+def move_north(layer: QgsVectorLayer, feature) -> None:
+    point = feature.geometry().asPoint()
+    layer.changeGeometry(
+        feature.id(), QgsGeometry.fromWkt(f"POINT({point.x()} {point.y() + 1})")
+    )
+
+
+def create_job(
+    layer: QgsVectorLayer, process_item: Optional[Callable[[Any], None]] = None
+) -> ChunkedEditJob:
+    return ChunkedEditJob(
+        layer,
+        "Move north",
+        layer.getFeatures(),
+        layer.featureCount(),
+        process_item or (lambda feature: move_north(layer, feature)),
+        chunk_size=10,
+    )
+
+
+def test_job_processes_all_items_as_one_edit_command(point_layer, qtbot):
+    job = create_job(point_layer)
+
+    with qtbot.waitSignal(job.finished, timeout=5000) as blocker:
+        job.start()
+
+    assert blocker.args == [True]
+    assert job.processed_count == 25
+    assert point_layer.undoStack().count() == 1
+    assert all(
+        feature.geometry().asPoint().y() == 1 for feature in point_layer.getFeatures()
+    )
+
+
+def test_canceled_job_undoes_its_edits(point_layer, qtbot):
+    def cancel_after_first_chunk(feature) -> None:
+        if job.processed_count == 10:
+            job.cancel()
+        else:
+            move_north(point_layer, feature)
+
+    job = create_job(point_layer, cancel_after_first_chunk)
+
+    with qtbot.waitSignal(job.finished, timeout=5000) as blocker:
+        job.start()
+
+    assert blocker.args == [False]
+    assert job.processed_count == 10
+    assert point_layer.undoStack().count() == 0
+    assert all(
+        feature.geometry().asPoint().y() == 0 for feature in point_layer.getFeatures()
+    )
+
+
+def test_progress_dialog_locks_the_main_window_while_running(point_layer, qtbot):
+    job = create_job(point_layer)
+
+    with qtbot.waitSignal(job.finished, timeout=5000):
+        job.start()
+        assert job._progress_dialog.isModal()
+
+    assert job._progress_dialog is None
@@ -0,0 +1,70 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from qgis.PyQt.QtWidgets import QApplication
+
+from pickLayer.core.clipboard_model import (
+    LARGE_CLIPBOARD_SIZE,
+    ClipboardModel,
+    parse_clipboard_text,
+)
+
+COPIED_FEATURES = (
+    "wkt_geom\tid\tname\r\nPoint (1 2)\t1\tfirst\r\nPoint (3 4)\t2\tsecond"
+)
+
+
+@pytest.fixture()
+def clipboard_model(qgis_app):
+    QApplication.clipboard().clear()
+    clipboard_model = ClipboardModel(QApplication.clipboard())
+    yield clipboard_model
+    clipboard_model.disconnect()
+
+
+def test_parse_clipboard_text_reads_first_feature():
+    feature = parse_clipboard_text(COPIED_FEATURES)
+
+    assert feature.field_names == ["id", "name"]
+    assert feature.attribute_values == ["1", "first"]
+    assert feature.geometry.asWkt() == "Point (1 2)"
+
+
+@pytest.mark.parametrize(
+    "text", ["", "just some text", "wkt_geom\tid\n"], ids=["empty", "line", "header"]
+)
+def test_parse_clipboard_text_without_features(text):
+    assert parse_clipboard_text(text) is None
+
+
+def test_model_parses_when_clipboard_changes(clipboard_model):
+    assert clipboard_model.feature is None
+
+    QApplication.clipboard().setText(COPIED_FEATURES)
+
+    assert clipboard_model.feature.attribute_values == ["1", "first"]
+
+
+def test_model_parses_large_clipboard_in_background(clipboard_model, qtbot):
+    rows = "\n".join(f"Point ({i} {i})\t{i}" for i in range(LARGE_CLIPBOARD_SIZE // 10))
+
+    QApplication.clipboard().setText(f"wkt_geom\tid\n{rows}")
+
+    qtbot.waitUntil(lambda: not clipboard_model.is_parsing(), timeout=5000)
+    assert clipboard_model.feature.attribute_values == ["0"]
@@ -0,0 +1,191 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import time
+
+import pytest
+from qgis.core import (
+    QgsCategorizedSymbolRenderer,
+    QgsGeometry,
+    QgsMarkerSymbol,
+    QgsRectangle,
+    QgsRendererCategory,
+    QgsVectorLayer,
+    QgsVectorLayerUtils,
+)
+
+from pickLayer.core.feature_query import (
+    LayerQuery,
+    LayerSearch,
+    TieredLayerSearch,
+    query_layer_geometries,
+)
+
+
+@pytest.fixture()
+def point_layer(qgis_iface):
+    layer = QgsVectorLayer("Point?crs=EPSG:3067&field=name:string", "points", "memory")
+    features = [
+        QgsVectorLayerUtils.createFeature(
+            layer, QgsGeometry.fromWkt(f"POINT({i} 0)"), {0: name}
+        )
+        for i, name in enumerate(["a", "b", "a"])
+    ]
+    success, _ = layer.dataProvider().addFeatures(features)
+    assert success
+    return layer
+
+
+def test_query_fetches_limited_geometries_without_attributes(point_layer, qgis_iface):
+    features = query_layer_geometries(
+        point_layer,
+        QgsRectangle(-1, -1, 3, 1),
+        qgis_iface.mapCanvas().mapSettings(),
+        limit=2,
+    )
+
+    assert len(features) == 2
+    assert all(feature.hasGeometry() for feature in features)
+    assert all(not feature.attribute("name") for feature in features)
+
+
+def test_query_skips_features_the_renderer_hides(point_layer, qgis_iface):
+    category = QgsRendererCategory("a", QgsMarkerSymbol.createSimple({}), "a")
+    point_layer.setRenderer(QgsCategorizedSymbolRenderer("name", [category]))
+
+    features = query_layer_geometries(
+        point_layer,
+        QgsRectangle(-1, -1, 3, 1),
+        qgis_iface.mapCanvas().mapSettings(),
+    )
+
+    assert [feature.geometry().asPoint().x() for feature in features] == [0, 2]
+
+
+def test_layer_search_keeps_the_layer_order(point_layer, qgis_iface):
+    map_settings = qgis_iface.mapCanvas().mapSettings()
+    search = LayerSearch(latency_budget=5000)
+    for x in [2, 0, 1]:
+        search.add_query(
+            LayerQuery(point_layer, QgsRectangle(x - 0.5, -1, x + 0.5, 1), map_settings)
+        )
+
+    search.start()
+    search.wait()
+
+    assert [hit.mFeature.geometry().asPoint().x() for hit in search.hits()] == [2, 0, 1]
+    assert search.skipped_layers == []
+
+
+def test_layer_search_skips_layers_over_the_latency_budget(
+    point_layer, qgis_iface, qtbot, mocker
+):
+    slow_query = LayerQuery(
+        point_layer, QgsRectangle(-1, -1, 3, 1), qgis_iface.mapCanvas().mapSettings()
+    )
+    mocker.patch.object(slow_query, "run", side_effect=lambda: time.sleep(1) or [])
+    search = LayerSearch(latency_budget=50)
+    search.add_query(slow_query)
+
+    with qtbot.waitSignal(search.finished, timeout=5000):
+        search.start()
+
+    assert search.hits() == []
+    assert search.skipped_layers == [point_layer]
+    assert slow_query.feedback.isCanceled()
+
+
+def test_layer_search_skips_layers_with_overdue_queries(
+    point_layer, qgis_iface, qtbot, mocker
+):
+    map_settings = qgis_iface.mapCanvas().mapSettings()
+    slow_query = LayerQuery(point_layer, QgsRectangle(-1, -1, 3, 1), map_settings)
+    mocker.patch.object(slow_query, "run", side_effect=lambda: time.sleep(1) or [])
+    slow_search = LayerSearch(latency_budget=50)
+    slow_search.add_query(slow_query)
+    slow_search.start()
+    slow_search.wait()
+    next_query = LayerQuery(point_layer, QgsRectangle(-1, -1, 3, 1), map_settings)
+    m_run = mocker.patch.object(next_query, "run", return_value=[])
+    next_search = LayerSearch(latency_budget=5000)
+    next_search.add_query(next_query)
+
+    with qtbot.waitSignal(next_search.finished, timeout=5000):
+        next_search.start()
+
+    m_run.assert_not_called()
+    assert next_search.skipped_layers == [point_layer]
+
+
+def create_tier(point_layer, rect: QgsRectangle, map_settings) -> LayerSearch:
+    tier = LayerSearch(latency_budget=5000)
+    tier.add_query(LayerQuery(point_layer, rect, map_settings))
+    return tier
+
+
+def test_tiered_search_stops_at_the_first_tier_with_features(point_layer, qgis_iface):
+    map_settings = qgis_iface.mapCanvas().mapSettings()
+    empty_tier = create_tier(point_layer, QgsRectangle(5, 5, 6, 6), map_settings)
+    found_tier = create_tier(point_layer, QgsRectangle(-0.5, -1, 0.5, 1), map_settings)
+    unused_tier = create_tier(point_layer, QgsRectangle(-1, -1, 3, 1), map_settings)
+    search = TieredLayerSearch([empty_tier, found_tier, unused_tier], 5000)
+
+    search.start()
+    search.wait()
+
+    assert [hit.mFeature.geometry().asPoint().x() for hit in search.hits()] == [0]
+    assert search.searched_tier_count == 2
+    assert not unused_tier.is_running()
+
+
+def test_tiered_search_gives_later_tiers_the_full_budget(
+    point_layer, qgis_iface, mocker
+):
+    map_settings = qgis_iface.mapCanvas().mapSettings()
+    slow_tier = create_tier(point_layer, QgsRectangle(-0.5, -1, 0.5, 1), map_settings)
+    mocker.patch.object(
+        slow_tier._queries[0], "run", side_effect=lambda: time.sleep(1) or []
+    )
+    found_tier = create_tier(point_layer, QgsRectangle(0.5, -1, 1.5, 1), map_settings)
+    search = TieredLayerSearch([slow_tier, found_tier], latency_budget=200)
+
+    search.start()
+    search.wait()
+
+    assert [hit.mFeature.geometry().asPoint().x() for hit in search.hits()] == [1]
+    assert search.skipped_layers == [point_layer]
+
+
+def test_tiered_search_counts_each_resolved_tier_once(
+    point_layer, qgis_iface, qtbot, mocker
+):
+    map_settings = qgis_iface.mapCanvas().mapSettings()
+    empty_tier = create_tier(point_layer, QgsRectangle(5, 5, 6, 6), map_settings)
+    slow_tier = create_tier(point_layer, QgsRectangle(-0.5, -1, 0.5, 1), map_settings)
+    run = slow_tier._queries[0].run
+    mocker.patch.object(
+        slow_tier._queries[0], "run", side_effect=lambda: time.sleep(0.3) or run()
+    )
+    search = TieredLayerSearch([empty_tier, slow_tier], latency_budget=5000)
+
+    with qtbot.waitSignal(search.finished, timeout=5000):
+        search.start()
+
+    assert [hit.mFeature.geometry().asPoint().x() for hit in search.hits()] == [0]
+    assert search.searched_tier_count == 2
+    assert search.skipped_layers == []
@@ -0,0 +1,75 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from qgis.core import QgsGeometry, QgsProject, QgsVectorLayer, QgsVectorLayerUtils
+
+from pickLayer.core.geometry_validity_index import GeometryValidityIndex
+
+VALID_WKT = "POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))"
+BOWTIE_WKT = "POLYGON((0 0, 1 1, 1 0, 0 1, 0 0))"
+
+
+@pytest.fixture()
+def validity_index():
+    validity_index = GeometryValidityIndex()
+    yield validity_index
+    validity_index.clear()
+
+
+@pytest.fixture()
+def polygon_layer(qgis_new_project):
+    layer = QgsVectorLayer("Polygon?crs=EPSG:3067", "polygons", "memory")
+    features = [
+        QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(wkt))
+        for wkt in [VALID_WKT, BOWTIE_WKT]
+    ]
+    success, _ = layer.dataProvider().addFeatures(features)
+    assert success
+    QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+def test_invalid_geometries_found_by_background_scan(
+    validity_index, polygon_layer, qtbot
+):
+    valid_feature, invalid_feature = polygon_layer.getFeatures()
+
+    assert validity_index.invalid_ids(polygon_layer) is None
+    assert validity_index.is_valid(polygon_layer, valid_feature)
+    assert not validity_index.is_valid(polygon_layer, invalid_feature)
+
+    qtbot.waitUntil(
+        lambda: validity_index.invalid_ids(polygon_layer) is not None, timeout=5000
+    )
+    assert validity_index.invalid_ids(polygon_layer) == {invalid_feature.id()}
+
+
+def test_index_follows_geometry_changes(validity_index, polygon_layer, qtbot):
+    valid_feature, invalid_feature = polygon_layer.getFeatures()
+    validity_index.invalid_ids(polygon_layer)
+    qtbot.waitUntil(
+        lambda: validity_index.invalid_ids(polygon_layer) is not None, timeout=5000
+    )
+
+    polygon_layer.startEditing()
+    polygon_layer.changeGeometry(invalid_feature.id(), QgsGeometry.fromWkt(VALID_WKT))
+    polygon_layer.changeGeometry(valid_feature.id(), QgsGeometry.fromWkt(BOWTIE_WKT))
+
+    assert validity_index.invalid_ids(polygon_layer) == {valid_feature.id()}
+    polygon_layer.rollBack()
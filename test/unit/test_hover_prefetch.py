@@ -0,0 +1,76 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle,
+    QgsVectorLayer,
+    QgsVectorLayerUtils,
+)
+
+from pickLayer.core.hover_prefetch import HoverPrefetcher
+
+
+@pytest.fixture()
+def canvas(qgis_iface, qgis_new_project):
+    layer = QgsVectorLayer("Point?crs=EPSG:3067", "points", "memory")
+    features = [
+        QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(wkt))
+        for wkt in ["POINT(0 0)", "POINT(3 0)"]
+    ]
+    success, _ = layer.dataProvider().addFeatures(features)
+    assert success
+    QgsProject.instance().addMapLayer(layer)
+
+    canvas = qgis_iface.mapCanvas()
+    canvas.setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
+    canvas.setLayers([layer])
+    canvas.setExtent(QgsRectangle(-100, -100, 100, 100))
+    # Avoid refreshes clearing the prefetched areas during the test
+    canvas.freeze(True)
+    yield canvas
+    canvas.freeze(False)
+
+
+@pytest.fixture()
+def prefetcher(canvas):
+    prefetcher = HoverPrefetcher(canvas)
+    yield prefetcher
+    prefetcher.disconnect()
+
+
+def test_features_around_resting_cursor_are_prefetched(prefetcher, qtbot):
+    click_rect = QgsRectangle(-0.1, -0.1, 0.1, 0.1)
+    assert prefetcher.hits_in(click_rect) is None
+
+    prefetcher.cursor_moved(QgsPointXY(0, 0))
+    qtbot.waitUntil(lambda: prefetcher.hits_in(click_rect) is not None, timeout=5000)
+
+    hits = prefetcher.hits_in(click_rect)
+    assert [hit.mFeature.geometry().asPoint() for hit in hits] == [QgsPointXY(0, 0)]
+
+
+def test_panning_does_not_prefetch(prefetcher, qtbot):
+    prefetcher.cursor_moved(QgsPointXY(0, 0), panning=True)
+    qtbot.wait(500)
+
+    assert prefetcher.hits_in(QgsRectangle(-0.1, -0.1, 0.1, 0.1)) is None
@@ -0,0 +1,110 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle,
+    QgsVectorLayer,
+    QgsVectorLayerUtils,
+)
+from qgis.PyQt.QtCore import QCoreApplication, QEvent
+
+from pickLayer.core.hover_preview import HoverPreview
+from pickLayer.core.set_active_layer_tool import SetActiveLayerTool
+
+
+def create_layer(uri: str, name: str, wkt: str) -> QgsVectorLayer:
+    layer = QgsVectorLayer(uri, name, "memory")
+    feature = QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(wkt))
+    success, _ = layer.dataProvider().addFeatures([feature])
+    assert success
+    return layer
+
+
+@pytest.fixture()
+def canvas(qgis_iface, qgis_new_project):
+    points = create_layer("Point?crs=EPSG:3067", "points", "POINT(0.5 0)")
+    lines = create_layer("LineString?crs=EPSG:3067", "lines", "LINESTRING(0 0, 0 1)")
+    QgsProject.instance().addMapLayers([points, lines])
+
+    canvas = qgis_iface.mapCanvas()
+    canvas.setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
+    canvas.setLayers([lines, points])
+    canvas.setExtent(QgsRectangle(-100, -100, 100, 100))
+    # Avoid refreshes clearing the fetched features during the test
+    canvas.freeze(True)
+    yield canvas
+    canvas.freeze(False)
+
+
+@pytest.fixture()
+def preview(canvas):
+    tool = SetActiveLayerTool(canvas)
+    preview = HoverPreview(canvas, tool._create_search, lambda: 1.0)
+    yield preview
+    preview.unload()
+
+
+def test_preview_shows_the_layer_a_click_would_activate(preview, qtbot):
+    preview.cursor_moved(QgsPointXY(0, 0))
+
+    qtbot.waitUntil(lambda: preview.previewed_layer is not None, timeout=5000)
+    assert preview.previewed_layer.name() == "points"
+
+
+def test_preview_reuses_features_near_the_fetch_location(preview, qtbot, mocker):
+    preview.cursor_moved(QgsPointXY(0, 0))
+    qtbot.waitUntil(lambda: preview.previewed_layer is not None, timeout=5000)
+    m_fetch = mocker.spy(preview, "_fetch")
+
+    # Point is out of the search radius, so the line wins
+    preview.cursor_moved(QgsPointXY(-0.6, 0.5))
+    qtbot.waitUntil(
+        lambda: preview.previewed_layer is not None
+        and preview.previewed_layer.name() == "lines",
+        timeout=5000,
+    )
+    m_fetch.assert_not_called()
+
+
+def test_preview_is_hidden_when_cursor_leaves_the_canvas(preview, canvas, qtbot):
+    preview.cursor_moved(QgsPointXY(0, 0))
+    qtbot.waitUntil(lambda: preview.previewed_layer is not None, timeout=5000)
+
+    QCoreApplication.sendEvent(canvas, QEvent(QEvent.Leave))
+
+    assert preview.previewed_layer is None
+
+
+def test_preview_refetches_with_click_radius_when_a_layer_hits_the_limit(
+    preview, qtbot, mocker
+):
+    mocker.patch("pickLayer.core.hover_preview.IDENTIFY_FEATURE_LIMIT", 1)
+    m_fetch = mocker.spy(preview, "_fetch")
+
+    preview.cursor_moved(QgsPointXY(0, 0))
+
+    qtbot.waitUntil(lambda: preview.previewed_layer is not None, timeout=5000)
+    assert preview.previewed_layer.name() == "points"
+    assert m_fetch.call_args_list[-1] == mocker.call(
+        QgsPointXY(0, 0), 1.0, radius_factor=1
+    )
@@ -0,0 +1,33 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+from unittest.mock import MagicMock
+
+from qgis.PyQt.QtCore import QPoint
+
+from pickLayer.core.identifygeometry import IdentifyGeometry
+
+
+def test_click_does_not_write_settings(qgis_iface, qtbot, mocker):
+    m_set_setting = mocker.patch("pickLayer.definitions.settings.set_setting")
+    map_tool = IdentifyGeometry(qgis_iface.mapCanvas())
+
+    map_tool.canvasReleaseEvent(MagicMock(**{"pos.return_value": QPoint(0, 0)}))
+    qtbot.waitUntil(lambda: map_tool.pending_search is None, timeout=5000)
+
+    m_set_setting.assert_not_called()
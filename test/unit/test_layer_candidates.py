@@ -0,0 +1,65 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+from unittest.mock import MagicMock
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsGeometry,
+    QgsPointXY,
+    QgsVectorLayer,
+    QgsVectorLayerUtils,
+)
+
+from pickLayer.core.layer_candidates import score_identify_results
+
+CRS = QgsCoordinateReferenceSystem("EPSG:3067")
+
+
+def create_results(geometry_type: str, wkts):
+    layer = QgsVectorLayer(f"{geometry_type}?crs=EPSG:3067", geometry_type, "memory")
+    results = []
+    for wkt in wkts:
+        feature = QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(wkt))
+        layer.dataProvider().addFeature(feature)
+        results.append(MagicMock(**{"mLayer": layer, "mFeature": feature}))
+    return results
+
+
+def test_best_only_skips_candidates_that_cannot_win(qgis_new_project):
+    polygons = create_results("Polygon", ["POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))"])
+    points = create_results("Point", ["POINT(3 0)", "POINT(1 0)", "POINT(2 0)"])
+
+    scores = score_identify_results(
+        polygons + points, QgsPointXY(0, 0), CRS, best_only=True
+    )
+
+    assert len(scores.candidates) == 1
+    assert scores.candidates[0].feature_id == points[1].mFeature.id()
+    assert scores.candidates[0].distance == 1
+    assert scores.skipped_distance_count == 3
+
+
+def test_all_candidates_ranked_without_pruning(qgis_new_project):
+    polygons = create_results("Polygon", ["POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))"])
+    points = create_results("Point", ["POINT(2 0)", "POINT(1 0)"])
+
+    scores = score_identify_results(polygons + points, QgsPointXY(0, 0), CRS)
+
+    assert [candidate.distance for candidate in scores.candidates] == [1, 2, 0]
+    assert scores.skipped_distance_count == 0
@@ -0,0 +1,264 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import time
+
+import pytest
+from qgis.core import (
+    NULL,
+    QgsField,
+    QgsGeometry,
+    QgsProject,
+    QgsVectorLayer,
+    QgsVectorLayerUtils,
+)
+from qgis.PyQt.QtCore import QVariant
+from qgis.PyQt.QtWidgets import QMenu
+
+from pickLayer.core.feature_highlighter import FLASH_DURATION
+from pickLayer.core.picklayer import ATTRIBUTE_MENU_PAGE_SIZE, PickLayer
+
+
+@pytest.fixture()
+def polygon_layer(qgis_new_project):
+    layer = QgsVectorLayer("Polygon?crs=EPSG:3067", "polygons", "memory")
+    feature = QgsVectorLayerUtils.createFeature(
+        layer, QgsGeometry.fromWkt("POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))")
+    )
+    success, _ = layer.dataProvider().addFeatures([feature])
+    assert success
+    QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+@pytest.fixture()
+def pick_layer(qgis_iface):
+    pick_layer = PickLayer()
+    yield pick_layer
+    pick_layer.unload()
+
+
+def test_context_menu_opens_while_highlight_still_running(
+    pick_layer, polygon_layer, mocker, qtbot
+):
+    menu_opened_at = []
+    mocker.patch.object(
+        QMenu,
+        "exec_",
+        side_effect=lambda *args: menu_opened_at.append(time.perf_counter()),
+    )
+    feature = next(polygon_layer.getFeatures())
+
+    started_at = time.perf_counter()
+    pick_layer.edit_feature(polygon_layer, feature)
+
+    # Previously the highlight blocked for the whole flash before the menu
+    time_to_menu = menu_opened_at[0] - started_at
+    assert time_to_menu < FLASH_DURATION / 1000
+    assert pick_layer.highlighter.is_flashing()
+    qtbot.waitUntil(lambda: not pick_layer.highlighter.is_flashing(), timeout=2000)
+
+
+def test_highlight_reuses_rubber_bands(pick_layer, polygon_layer):
+    pick_layer.selected_layer = polygon_layer
+    geometry = next(polygon_layer.getFeatures()).geometry()
+    scene_items_before = len(pick_layer.map_canvas.scene().items())
+
+    for _ in range(10):
+        pick_layer.highlight(geometry)
+
+    assert len(pick_layer.map_canvas.scene().items()) - scene_items_before <= 3
+
+
+def test_attributes_menu_filled_lazily_in_pages(pick_layer, polygon_layer):
+    field_count = 2 * ATTRIBUTE_MENU_PAGE_SIZE + 10
+    polygon_layer.dataProvider().addAttributes(
+        [QgsField(f"field_{i}", QVariant.String) for i in range(field_count)]
+    )
+    polygon_layer.updateFields()
+    pick_layer.selected_layer = polygon_layer
+    pick_layer.selected_feature = next(polygon_layer.getFeatures())
+    pick_layer.selected_feature.setAttributes(
+        [f"value_{i}" for i in range(field_count)]
+    )
+    attribute_menu = QMenu()
+
+    pick_layer.populate_attributes_menu(attribute_menu)
+    pick_layer.populate_attributes_menu(attribute_menu)
+
+    actions = attribute_menu.actions()
+    assert len(actions) == ATTRIBUTE_MENU_PAGE_SIZE + 1
+    assert actions[0].text() == "field_0: value_0"
+
+    second_page = actions[-1].menu()
+    assert second_page.isEmpty()
+    second_page.aboutToShow.emit()
+    assert len(second_page.actions()) == ATTRIBUTE_MENU_PAGE_SIZE + 1
+
+    last_page = second_page.actions()[-1].menu()
+    last_page.aboutToShow.emit()
+    assert [action.text() for action in last_page.actions()][-1] == (
+        f"field_{field_count - 1}: value_{field_count - 1}"
+    )
+
+
+def test_paste_attributes_on_selection_matches_fields_by_name(
+    pick_layer, polygon_layer
+):
+    polygon_layer.dataProvider().addAttributes(
+        [QgsField("id", QVariant.String), QgsField("name", QVariant.String)]
+    )
+    polygon_layer.updateFields()
+    polygon_layer.dataProvider().addFeatures(
+        [
+            QgsVectorLayerUtils.createFeature(
+                polygon_layer, QgsGeometry.fromWkt("POLYGON((2 2, 2 3, 3 3, 2 2))")
+            )
+        ]
+    )
+    polygon_layer.selectAll()
+    polygon_layer.startEditing()
+    pick_layer.selected_layer = polygon_layer
+    pick_layer.clip_attrs_fieldnames = ["name", "unknown", "id"]
+    pick_layer.clip_attrs_values = ["pasted", "ignored", "NULL"]
+    undo_steps_before = polygon_layer.undoStack().count()
+
+    pick_layer.paste_attrs_on_selection_func()
+
+    assert polygon_layer.undoStack().count() == undo_steps_before + 1
+    for feature in polygon_layer.getFeatures():
+        assert feature["name"] == "pasted"
+        assert feature["id"] == NULL
+    polygon_layer.rollBack()
+
+
+def test_paste_attributes_skips_primary_key_and_read_only_fields(
+    pick_layer, polygon_layer, mocker
+):
+    polygon_layer.dataProvider().addAttributes(
+        [
+            QgsField("fid", QVariant.Int),
+            QgsField("locked", QVariant.String),
+            QgsField("count", QVariant.Int),
+        ]
+    )
+    polygon_layer.updateFields()
+    form_config = polygon_layer.editFormConfig()
+    form_config.setReadOnly(polygon_layer.fields().lookupField("locked"), True)
+    polygon_layer.setEditFormConfig(form_config)
+    mocker.patch.object(
+        polygon_layer,
+        "primaryKeyAttributes",
+        return_value=[polygon_layer.fields().lookupField("fid")],
+    )
+    pick_layer.selected_layer = polygon_layer
+    pick_layer.clip_attrs_fieldnames = ["fid", "locked", "count"]
+    pick_layer.clip_attrs_values = ["1", "pasted", "5"]
+
+    assert pick_layer._get_clipboard_attribute_values() == {
+        polygon_layer.fields().lookupField("count"): 5
+    }
+
+
+def test_merge_selection_merges_selected_into_picked(pick_layer, polygon_layer, qtbot):
+    polygon_layer.dataProvider().addFeatures(
+        [
+            QgsVectorLayerUtils.createFeature(
+                polygon_layer, QgsGeometry.fromWkt("POLYGON((1 0, 1 1, 2 1, 2 0, 1 0))")
+            )
+        ]
+    )
+    picked_feature, other_feature = polygon_layer.getFeatures()
+    polygon_layer.selectAll()
+    polygon_layer.startEditing()
+    pick_layer.selected_layer = polygon_layer
+    pick_layer.selected_feature = picked_feature
+
+    pick_layer.merge_selection_func()
+    with qtbot.waitSignal(pick_layer.batch_job.finished, timeout=5000):
+        pass
+
+    assert polygon_layer.featureCount() == 1
+    assert polygon_layer.getFeature(picked_feature.id()).geometry().area() == 2
+    polygon_layer.rollBack()
+
+
+def test_subtract_from_selection_clips_only_selected_features(
+    pick_layer, polygon_layer, qtbot
+):
+    overlapping_wkt = "POLYGON((0.5 0, 0.5 1, 2 1, 2 0, 0.5 0))"
+    polygon_layer.dataProvider().addFeatures(
+        [
+            QgsVectorLayerUtils.createFeature(
+                polygon_layer, QgsGeometry.fromWkt(overlapping_wkt)
+            )
+            for _ in range(2)
+        ]
+    )
+    picked_feature, selected, not_selected = polygon_layer.getFeatures()
+    polygon_layer.selectByIds([picked_feature.id(), selected.id()])
+    polygon_layer.startEditing()
+    pick_layer.selected_layer = polygon_layer
+    pick_layer.selected_feature = picked_feature
+
+    pick_layer.subtract_from_selection_func()
+    with qtbot.waitSignal(pick_layer.batch_job.finished, timeout=5000):
+        pass
+
+    assert pick_layer.batch_job.processed_count == 1
+    assert polygon_layer.getFeature(selected.id()).geometry().area() == 1
+    assert (
+        polygon_layer.getFeature(not_selected.id())
+        .geometry()
+        .equals(not_selected.geometry())
+    )
+    assert polygon_layer.getFeature(picked_feature.id()).geometry().area() == 1
+    polygon_layer.rollBack()
+
+
+def test_subtract_from_overlapping_clips_only_overlapping_features(
+    pick_layer, polygon_layer, qtbot
+):
+    polygon_layer.dataProvider().addFeatures(
+        [
+            QgsVectorLayerUtils.createFeature(polygon_layer, QgsGeometry.fromWkt(wkt))
+            for wkt in [
+                "POLYGON((0.5 0, 0.5 1, 2 1, 2 0, 0.5 0))",  # overlaps half
+                "POLYGON((1 1, 1 2, 2 2, 2 1, 1 1))",  # touches corner
+                "POLYGON((5 5, 5 6, 6 6, 6 5, 5 5))",  # far away
+            ]
+        ]
+    )
+    picked_feature, overlapping, touching, far_away = polygon_layer.getFeatures()
+    polygon_layer.startEditing()
+    pick_layer.selected_layer = polygon_layer
+    pick_layer.selected_feature = picked_feature
+
+    pick_layer.subtract_from_overlapping_func()
+    with qtbot.waitSignal(pick_layer.batch_job.finished, timeout=5000):
+        pass
+
+    assert pick_layer.batch_job.processed_count == 2
+    assert polygon_layer.getFeature(overlapping.id()).geometry().area() == 1
+    assert (
+        polygon_layer.getFeature(touching.id()).geometry().equals(touching.geometry())
+    )
+    assert (
+        polygon_layer.getFeature(far_away.id()).geometry().equals(far_away.geometry())
+    )
+    polygon_layer.rollBack()
@@ -16,12 +16,29 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import os
+import subprocess
+import sys
+import tracemalloc
+from pathlib import Path
+
 import pytest
 from qgis.core import QgsPointXY
 from qgis.gui import QgsMapTool
+from qgis.PyQt.QtCore import QCoreApplication, QEvent
 
+import pickLayer
 from pickLayer import classFactory
 
+LAZY_MODULES = [
+    "pickLayer.core.picklayer",
+    "pickLayer.core.set_active_layer_tool",
+    "pickLayer.ui.settings_dialog",
+]
+SOAK_ACTIVATION_COUNT = 2000
+# Allowed Python heap growth over the soak activations
+SOAK_HEAP_GROWTH_LIMIT = 256 * 1024  # bytes
+
 
 @pytest.fixture()
 def plugin_initialized(mock_iface, qgis_iface):
@@ -85,3 +102,93 @@ def test_set_active_layer_tool_selected_doesnt_save_current_map_tool_if_tool_not
     plugin_initialized._set_active_layer_tool_selected()
 
     assert plugin_initialized.set_active_layer_tool.previous_map_tool is None
+
+
+def test_map_tools_are_created_on_first_use(plugin_initialized):
+    assert plugin_initialized._set_active_layer_tool is None
+    assert plugin_initialized.pick_layer_tool is None
+
+    tool = plugin_initialized.set_active_layer_tool
+
+    assert tool.action() is plugin_initialized.set_active_layer_action
+    assert plugin_initialized.set_active_layer_tool is tool
+
+
+def test_plugin_import_does_not_load_map_tools_or_settings_ui():
+    code = (
+        "import sys, pickLayer.plugin; "
+        f"print([name for name in {LAZY_MODULES} if name in sys.modules])"
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(Path(pickLayer.__file__).parent.parent), env.get("PYTHONPATH", "")]
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+def delete_later_deleted_objects() -> None:
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+def test_pick_layer_is_reused_across_activations(plugin_initialized):
+    plugin_initialized._activate_pick_layer()
+    pick_layer_tool = plugin_initialized.pick_layer_tool
+
+    plugin_initialized._set_active_layer_tool_selected()
+    plugin_initialized._activate_pick_layer()
+
+    assert plugin_initialized.pick_layer_tool is pick_layer_tool
+
+
+def test_unload_removes_map_tools_from_canvas(plugin_initialized, qgis_iface):
+    canvas = qgis_iface.mapCanvas()
+    tool_count = len(canvas.findChildren(QgsMapTool))
+    plugin_initialized._set_active_layer_tool_selected()
+    plugin_initialized._activate_pick_layer()
+
+    plugin_initialized.unload()
+    delete_later_deleted_objects()
+
+    assert canvas.mapTool() is None
+    assert len(canvas.findChildren(QgsMapTool)) == tool_count
+    assert plugin_initialized.pick_layer_tool is None
+
+
+def test_activations_do_not_grow_heap(plugin_initialized, qgis_iface):
+    canvas = qgis_iface.mapCanvas()
+
+    def activate_tools(count: int) -> None:
+        for _ in range(count):
+            plugin_initialized._activate_pick_layer()
+            plugin_initialized._set_active_layer_tool_selected()
+        delete_later_deleted_objects()
+
+    activate_tools(100)
+    tool_count = len(canvas.findChildren(QgsMapTool))
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        activate_tools(SOAK_ACTIVATION_COUNT)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    ignore_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    heap_growth = sum(
+        stat.size_diff
+        for stat in after.filter_traces(ignore_tracemalloc).compare_to(
+            before.filter_traces(ignore_tracemalloc), "filename"
+        )
+    )
+    assert heap_growth < SOAK_HEAP_GROWTH_LIMIT
+    assert len(canvas.findChildren(QgsMapTool)) == tool_count
+    plugin_initialized.unload()
@@ -0,0 +1,65 @@
+#  Copyright (C) 2021-2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import pstats
+
+import pytest
+
+from pickLayer.core import profiling
+
+
+@pytest.fixture()
+def profile_folder(tmp_path, mocker):
+    mocker.patch.object(profiling, "PROFILER", "cprofile")
+    mocker.patch.object(profiling, "get_log_folder", return_value=tmp_path)
+    return tmp_path / "profiles"
+
+
+def test_functions_are_not_wrapped_without_profiler(mocker):
+    mocker.patch.object(profiling, "PROFILER", "")
+
+    def function():
+        pass
+
+    assert profiling.profiled(function) is function
+
+
+def test_profiles_are_saved_and_rotated(profile_folder, mocker):
+    mocker.patch.object(profiling, "PROFILE_FILE_COUNT", 2)
+
+    @profiling.profiled
+    def inner() -> int:
+        return 1
+
+    @profiling.profiled
+    def outer() -> int:
+        return inner() + 1
+
+    assert outer() == 2
+    paths = list(profile_folder.glob("*.pstats"))
+    # The inner call is a part of the outer profile
+    assert len(paths) == 1
+    assert "outer" in paths[0].name
+    assert any(
+        function_name == "inner"
+        for _, _, function_name in pstats.Stats(str(paths[0])).stats
+    )
+
+    outer()
+    outer()
+    assert len(list(profile_folder.glob("*.pstats"))) == 2
@@ -17,6 +17,7 @@
 #  You should have received a copy of the GNU General Public License
 #  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
 
+import time
 from typing import List, Tuple
 from unittest.mock import MagicMock
 
@@ -24,18 +25,24 @@ import pytest
 from pytest_mock import MockerFixture
 from pytest_qgis import QgisInterface
 from qgis.core import (
+    QgsCategorizedSymbolRenderer,
     QgsCoordinateReferenceSystem,
     QgsFields,
     QgsGeometry,
+    QgsMarkerSymbol,
     QgsMemoryProviderUtils,
     QgsPointXY,
     QgsProject,
     QgsRasterLayer,
+    QgsRendererCategory,
     QgsVectorLayer,
     QgsVectorLayerUtils,
 )
 from qgis.gui import QgsMapTool, QgsMapToolIdentify
+from qgis.PyQt.QtCore import QEvent, Qt
+from qgis.PyQt.QtGui import QKeyEvent
 
+from pickLayer.core.feature_query import LayerQuery
 from pickLayer.core.set_active_layer_tool import SetActiveLayerTool
 from pickLayer.definitions.settings import Settings
 from pickLayer.qgis_plugin_tools.tools.resources import plugin_test_data_path
@@ -109,13 +116,13 @@ def test_layers():
     ),
     argvalues=[
         (0.5, 0),
-        (1.5, 3),
-        (2.5, 6),
+        (1.5, 1),
+        (2.5, 2),
     ],
     ids=[
         "radius-0.5m-none-found",
-        "radius-1.5m-half-found",
-        "radius-2.5m-all-found",
+        "radius-1.5m-closer-point-found",
+        "radius-2.5m-only-points-found",
     ],
 )
 def test_set_active_layer_using_closest_feature(
@@ -138,6 +145,50 @@ def test_set_active_layer_using_closest_feature(
     assert len(identify_results) == expected_num_results
 
 
+@pytest.mark.parametrize("search_radius", [0.5, 1.5, 2.5, 10])
+def test_tiered_search_chooses_the_same_layer_as_full_search(
+    map_tool, test_layers, search_radius
+):
+    def choose_layer(tiered: bool):
+        results = map_tool._identify_candidates(
+            MOUSE_LOCATION, search_radius, tiered=tiered
+        )
+        return map_tool._choose_layer_from_identify_results(results, MOUSE_LOCATION)
+
+    assert choose_layer(tiered=True) == choose_layer(tiered=False)
+
+
+def test_tiered_search_chooses_the_same_layer_when_point_layer_is_slow(
+    map_tool, test_layers, mocker
+):
+    run = LayerQuery.run
+
+    def slow_point_layer_run(query: LayerQuery):
+        if query.layer.name() == "point_layer":
+            time.sleep(1)
+            return []
+        return run(query)
+
+    mocker.patch.object(
+        LayerQuery, "run", autospec=True, side_effect=slow_point_layer_run
+    )
+    Settings.query_latency_budget.set(200)
+
+    def choose_layer(tiered: bool):
+        results = map_tool._identify_candidates(MOUSE_LOCATION, 10, tiered=tiered)
+        return map_tool._choose_layer_from_identify_results(results, MOUSE_LOCATION)
+
+    try:
+        tiered_choice = choose_layer(tiered=True)
+        full_choice = choose_layer(tiered=False)
+    finally:
+        Settings.query_latency_budget.set(Settings.query_latency_budget.value)
+
+    assert tiered_choice is not None
+    assert tiered_choice.name() != "point_layer"
+    assert tiered_choice == full_choice
+
+
 def test_get_default_search_radius_changes_if_settings_changed(
     map_tool,
 ):
@@ -215,7 +266,7 @@ def test_preferred_type_chosen_from_different_types(
 
     QgsProject.instance().setCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
 
-    mocker.patch.object(map_tool, "identify", return_value=results)
+    mocker.patch.object(map_tool, "_identify_candidates", return_value=results)
 
     m_set_active_layer = mocker.patch.object(
         qgis_iface, "setActiveLayer", return_value=None
@@ -246,7 +297,7 @@ def test_closest_of_same_type_chosen(
     QgsProject.instance().setCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
     map_tool.canvas().setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
 
-    mocker.patch.object(map_tool, "identify", return_value=results)
+    mocker.patch.object(map_tool, "_identify_candidates", return_value=results)
 
     m_set_active_layer = mocker.patch.object(
         qgis_iface, "setActiveLayer", return_value=None
@@ -279,7 +330,7 @@ def test_closest_of_same_type_chosen_even_if_project_and_layer_crs_differs(
     QgsProject.instance().setCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
     map_tool.canvas().setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
 
-    mocker.patch.object(map_tool, "identify", return_value=results)
+    mocker.patch.object(map_tool, "_identify_candidates", return_value=results)
 
     m_set_active_layer = mocker.patch.object(
         qgis_iface, "setActiveLayer", return_value=None
@@ -310,7 +361,7 @@ def test_line_crossing_origin_chosen_as_closest(
     QgsProject.instance().setCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
     map_tool.canvas().setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
 
-    mocker.patch.object(map_tool, "identify", return_value=results)
+    mocker.patch.object(map_tool, "_identify_candidates", return_value=results)
 
     m_set_active_layer = mocker.patch.object(
         qgis_iface, "setActiveLayer", return_value=None
@@ -341,7 +392,7 @@ def test_top_polygon_chosen_from_multiple_nested_even_if_top_not_closest(
     QgsProject.instance().setCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
     map_tool.canvas().setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
 
-    mocker.patch.object(map_tool, "identify", return_value=results)
+    mocker.patch.object(map_tool, "_identify_candidates", return_value=results)
 
     m_set_active_layer = mocker.patch.object(
         qgis_iface, "setActiveLayer", return_value=None
@@ -409,3 +460,134 @@ def test_activate_layer_and_previous_map_tool_doesnt_change_tool_when_previous_n
 
     m_logger_info.assert_called_once()
     m_iface_mapcanvas.assert_not_called()
+
+
+def test_find_closest_features_returns_match_for_each_point(
+    map_tool: SetActiveLayerTool,
+    mocker: MockerFixture,
+    qgis_iface: QgisInterface,
+    qgis_new_project,
+):
+    layers = []
+    for wkt, layer_name in [
+        ("POINT(0 0)", "point"),
+        ("LINESTRING(2 -5, 2 5)", "line"),
+        ("POLYGON((5 -1, 5 1, 7 1, 7 -1, 5 -1))", "polygon"),
+    ]:
+        layer = create_identify_result([(wkt, "EPSG:3067", layer_name)])[0].mLayer
+        QgsProject.instance().addMapLayer(layer)
+        layers.append(layer)
+    map_tool.canvas().setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
+    map_tool.canvas().setLayers(layers)
+    m_set_active_layer = mocker.patch.object(
+        qgis_iface, "setActiveLayer", return_value=None
+    )
+
+    results = map_tool.find_closest_features(
+        [QgsPointXY(0.5, 0), (2.5, 3), (6, 0), (20, 20)], search_radius=2
+    )
+
+    m_set_active_layer.assert_not_called()
+    assert [result.layer.name() for result in results[:3]] == [
+        "point",
+        "line",
+        "polygon",
+    ]
+    assert [result.distance for result in results[:3]] == pytest.approx([0.5, 0.5, 0])
+    assert results[3] is None
+
+
+def test_find_closest_features_queries_layer_once_and_skips_hidden_features(
+    map_tool: SetActiveLayerTool,
+    mocker: MockerFixture,
+    qgis_new_project,
+):
+    layer = QgsVectorLayer("Point?crs=EPSG:3067&field=name:string", "points", "memory")
+    features = [
+        QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(wkt), {0: name})
+        for wkt, name in [("POINT(0 0)", "hidden"), ("POINT(1 0)", "shown")]
+    ]
+    success, _ = layer.dataProvider().addFeatures(features)
+    assert success
+    category = QgsRendererCategory("shown", QgsMarkerSymbol.createSimple({}), "shown")
+    layer.setRenderer(QgsCategorizedSymbolRenderer("name", [category]))
+    QgsProject.instance().addMapLayer(layer)
+    map_tool.canvas().setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
+    map_tool.canvas().setLayers([layer])
+    m_run = mocker.spy(LayerQuery, "run")
+
+    results = map_tool.find_closest_features(
+        [(x / 10, 0) for x in range(10)], search_radius=2
+    )
+
+    assert m_run.call_count == 1
+    shown_fid = [f.id() for f in layer.getFeatures() if f["name"] == "shown"][0]
+    assert {result.feature_id for result in results} == {shown_fid}
+    assert results[0].distance == pytest.approx(1)
+
+
+def test_find_candidates_returns_ranked_list_without_activating(
+    map_tool: SetActiveLayerTool,
+    mocker: MockerFixture,
+    qgis_iface: QgisInterface,
+):
+    results = create_identify_result(
+        [
+            ("POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))", "EPSG:3067", "polygon"),
+            ("POINT(4 4)", "EPSG:3067", "point-far"),
+            ("POINT(2 2)", "EPSG:3067", "point-close"),
+        ]
+    )
+    QgsProject.instance().setCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
+    map_tool.canvas().setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3067"))
+    mocker.patch.object(map_tool, "_identify_candidates", return_value=results)
+    m_set_active_layer = mocker.patch.object(
+        qgis_iface, "setActiveLayer", return_value=None
+    )
+
+    candidates = map_tool.find_candidates(QgsPointXY(1, 1))
+
+    m_set_active_layer.assert_not_called()
+    assert [candidate.layer_id for candidate in candidates] == [
+        results[2].mLayer.id(),
+        results[1].mLayer.id(),
+        results[0].mLayer.id(),
+    ]
+    assert [candidate.geometry_type_rank for candidate in candidates] == [1, 1, 3]
+    assert candidates[0].feature_id == results[2].mFeature.id()
+    assert candidates[2].distance == 0
+
+
+def test_repeated_clicks_are_merged_into_one_search(
+    map_tool: SetActiveLayerTool,
+    mocker: MockerFixture,
+    qgis_iface: QgisInterface,
+    qtbot,
+):
+    m_choose_layer_from_identify_results = mocker.patch.object(
+        map_tool, "_choose_layer_from_identify_results", return_value=None
+    )
+
+    map_tool._start_click_search(QgsPointXY(0, 0))
+    first_search = map_tool.pending_search
+    map_tool._start_click_search(QgsPointXY(1, 1))
+    qtbot.waitUntil(lambda: map_tool.pending_search is None, timeout=5000)
+
+    assert first_search.canceled
+    m_choose_layer_from_identify_results.assert_called_once()
+    assert m_choose_layer_from_identify_results.call_args.args[1] == QgsPointXY(1, 1)
+
+
+def test_escape_cancels_running_search(
+    map_tool: SetActiveLayerTool,
+    mocker: MockerFixture,
+):
+    m_choose_layer_from_identify_results = mocker.patch.object(
+        map_tool, "_choose_layer_from_identify_results", return_value=None
+    )
+    map_tool._start_click_search(QgsPointXY(0, 0))
+
+    map_tool.keyPressEvent(QKeyEvent(QEvent.KeyPress, Qt.Key_Escape, Qt.NoModifier))
+
+    assert map_tool.pending_search is None
+    m_choose_layer_from_identify_results.assert_not_called()
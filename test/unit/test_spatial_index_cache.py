@@ -0,0 +1,150 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import math
+
+import pytest
+from qgis.core import (
+    QgsCategorizedSymbolRenderer,
+    QgsGeometry,
+    QgsMarkerSymbol,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle,
+    QgsRendererCategory,
+    QgsVectorLayer,
+    QgsVectorLayerUtils,
+)
+
+from pickLayer.core.set_active_layer_tool import SetActiveLayerTool
+from pickLayer.core.spatial_index_cache import SpatialIndexCache
+
+
+def create_point_layer(name: str, *wkts: str) -> QgsVectorLayer:
+    layer = QgsVectorLayer("Point?crs=EPSG:3067", name, "memory")
+    features = [
+        QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(wkt))
+        for wkt in wkts
+    ]
+    success, _ = layer.dataProvider().addFeatures(features)
+    assert success
+    return layer
+
+
+@pytest.fixture()
+def cache():
+    cache = SpatialIndexCache()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture()
+def point_layer(qgis_new_project):
+    layer = create_point_layer("points", "POINT(0 0)", "POINT(10 10)")
+    QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+def wait_until_ready(qtbot, cache, layer):
+    assert cache.features_in_rect(layer, QgsRectangle(0, 0, 1, 1)) is None
+    qtbot.waitUntil(lambda: cache.is_ready(layer), timeout=5000)
+
+
+def test_features_in_rect_uses_built_index(cache, point_layer, qtbot):
+    wait_until_ready(qtbot, cache, point_layer)
+
+    features = cache.features_in_rect(point_layer, QgsRectangle(-1, -1, 1, 1))
+
+    assert len(features) == 1
+    assert features[0].geometry().asPoint() == QgsPointXY(0, 0)
+
+
+def test_index_follows_layer_edits(cache, point_layer, qtbot):
+    wait_until_ready(qtbot, cache, point_layer)
+    search_rect = QgsRectangle(4, 4, 6, 6)
+    assert cache.features_in_rect(point_layer, search_rect) == []
+
+    point_layer.startEditing()
+    feature = QgsVectorLayerUtils.createFeature(
+        point_layer, QgsGeometry.fromWkt("POINT(5 5)")
+    )
+    point_layer.addFeature(feature)
+    added_fid = cache.features_in_rect(point_layer, search_rect)[0].id()
+
+    point_layer.changeGeometry(added_fid, QgsGeometry.fromWkt("POINT(20 20)"))
+    assert cache.features_in_rect(point_layer, search_rect) == []
+    assert len(cache.features_in_rect(point_layer, QgsRectangle(19, 19, 21, 21))) == 1
+
+    point_layer.deleteFeature(added_fid)
+    assert cache.features_in_rect(point_layer, QgsRectangle(19, 19, 21, 21)) == []
+    point_layer.rollBack()
+
+
+def test_least_recently_queried_layer_evicted(cache, qgis_new_project, qtbot):
+    first_layer = create_point_layer("first", "POINT(0 0)")
+    second_layer = create_point_layer("second", "POINT(0 0)")
+    QgsProject.instance().addMapLayers([first_layer, second_layer])
+
+    wait_until_ready(qtbot, cache, first_layer)
+    cache.memory_budget = cache.total_size
+    wait_until_ready(qtbot, cache, second_layer)
+
+    assert not cache.is_ready(first_layer)
+    assert cache.is_ready(second_layer)
+
+
+def test_set_active_layer_tool_uses_cache_for_indexed_layers(
+    cache, point_layer, qgis_iface, qtbot, mocker
+):
+    qgis_iface.mapCanvas().setLayers([point_layer])
+    map_tool = SetActiveLayerTool(qgis_iface.mapCanvas(), cache)
+    wait_until_ready(qtbot, cache, point_layer)
+    m_query = mocker.patch("pickLayer.core.set_active_layer_tool.LayerQuery")
+
+    results = map_tool._identify_candidates(QgsPointXY(9, 9), 2)
+
+    m_query.assert_not_called()
+    assert [result.mFeature.geometry().asPoint() for result in results] == [
+        QgsPointXY(10, 10)
+    ]
+
+
+def test_set_active_layer_tool_skips_cache_when_renderer_hides_features(
+    cache, qgis_new_project, qgis_iface, qtbot
+):
+    layer = QgsVectorLayer("Point?crs=EPSG:3067&field=name:string", "points", "memory")
+    features = []
+    for name, wkt in [("hidden", "POINT(9 9)"), ("shown", "POINT(10 10)")]:
+        feature = QgsVectorLayerUtils.createFeature(layer, QgsGeometry.fromWkt(wkt))
+        feature.setAttribute("name", name)
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    category = QgsRendererCategory("shown", QgsMarkerSymbol.createSimple({}), "shown")
+    layer.setRenderer(QgsCategorizedSymbolRenderer("name", [category]))
+    QgsProject.instance().addMapLayer(layer)
+    qgis_iface.mapCanvas().setLayers([layer])
+    map_tool = SetActiveLayerTool(qgis_iface.mapCanvas(), cache)
+    wait_until_ready(qtbot, cache, layer)
+
+    results = map_tool._identify_candidates(QgsPointXY(9, 9), 2)
+    closest = map_tool.find_closest_features([(9, 9)], 2)
+
+    assert [result.mFeature.geometry().asPoint() for result in results] == [
+        QgsPointXY(10, 10)
+    ]
+    assert closest[0].distance == pytest.approx(math.sqrt(2))
@@ -0,0 +1,60 @@
+#  Copyright (C) 2021-2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import json
+
+from pickLayer.core.timing_metrics import Stage, TimingMetrics
+
+
+def test_summary_has_percentiles_per_stage_and_provider():
+    metrics = TimingMetrics()
+    for duration in range(1, 101):
+        metrics.record(Stage.IDENTIFY, float(duration), "ogr")
+    metrics.record(Stage.IDENTIFY, 1000.0, "memory")
+
+    summary = metrics.summary()
+
+    ogr_summary = summary["identify"]["ogr"]
+    assert ogr_summary["count"] == 100
+    assert ogr_summary["p50_ms"] == 50
+    assert ogr_summary["p95_ms"] == 95
+    assert ogr_summary["p99_ms"] == 99
+    assert ogr_summary["histogram"]["<=1ms"] == 1
+    assert ogr_summary["histogram"]["<=100ms"] == 50
+    assert summary["identify"]["all"]["count"] == 101
+    assert summary["identify"]["all"]["max_ms"] == 1000
+    assert summary["identify"]["memory"]["p99_ms"] == 1000
+
+
+def test_measure_records_duration():
+    metrics = TimingMetrics()
+
+    with metrics.measure(Stage.SCORING):
+        pass
+
+    assert metrics.summary()["scoring"]["all"]["count"] == 1
+    assert "scoring" not in TimingMetrics().summary()
+
+
+def test_export_json(tmp_path):
+    metrics = TimingMetrics()
+    metrics.record(Stage.MENU, 5.0, "memory")
+
+    path = metrics.export_json(tmp_path / "timings.json")
+
+    assert json.loads(path.read_text())["menu"]["memory"]["count"] == 1
@@ -0,0 +1,72 @@
+#  Copyright (C) 2022 National Land Survey of Finland
+#  (https://www.maanmittauslaitos.fi/en).
+#
+#
+#  This file is part of PickLayer.
+#
+#  PickLayer is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  PickLayer is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with PickLayer. If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from qgis.core import QgsCoordinateReferenceSystem, QgsCsException, QgsPointXY
+
+from pickLayer.core.transform_cache import TransformCache
+
+ETRS_TM35FIN = QgsCoordinateReferenceSystem("EPSG:3067")
+WGS84 = QgsCoordinateReferenceSystem("EPSG:4326")
+
+
+@pytest.fixture()
+def transform_cache(qgis_iface):
+    transform_cache = TransformCache()
+    yield transform_cache
+    transform_cache.disconnect()
+
+
+def test_transform_is_reused(transform_cache):
+    transform = transform_cache.get(ETRS_TM35FIN, WGS84)
+
+    assert transform_cache.get(QgsCoordinateReferenceSystem("EPSG:3067"), WGS84) is (
+        transform
+    )
+    assert transform_cache.get(WGS84, ETRS_TM35FIN) is not transform
+
+
+def test_cache_cleared_when_canvas_crs_changes(transform_cache, qgis_iface):
+    transform = transform_cache.get(ETRS_TM35FIN, WGS84)
+
+    qgis_iface.mapCanvas().setDestinationCrs(WGS84)
+    qgis_iface.mapCanvas().setDestinationCrs(ETRS_TM35FIN)
+
+    assert transform_cache.get(ETRS_TM35FIN, WGS84) is not transform
+
+
+def test_transform_points_matches_single_point_transforms(transform_cache):
+    points = [QgsPointXY(250000, 6700000), QgsPointXY(400000, 7000000)]
+
+    transformed = transform_cache.transform_points(points, ETRS_TM35FIN, WGS84)
+
+    for point, transformed_point in zip(points, transformed):
+        expected = transform_cache.transform_point(point, ETRS_TM35FIN, WGS84)
+        assert transformed_point.x() == pytest.approx(expected.x())
+        assert transformed_point.y() == pytest.approx(expected.y())
+
+
+def test_point_that_can_not_be_transformed_is_returned_as_is(transform_cache, mocker):
+    transform = transform_cache.get(WGS84, ETRS_TM35FIN)
+    mocker.patch.object(
+        transform, "transform", side_effect=QgsCsException("out of bounds")
+    )
+
+    transformed = transform_cache.transform_point(QgsPointXY(1, 2), WGS84, ETRS_TM35FIN)
+
+    assert transformed == QgsPointXY(1, 2)